@@ -1,5 +1,13 @@
 import heapq
-from bitio import BitReader, BitWriter
+import io
+import sys
+import tempfile
+from array import array
+from collections import Counter
+from functools import lru_cache
+from bitio import BUFFER_SIZE, BitReader, BitWriter, iter_chunks, open_input, split_chunks
+from checksum import ChecksumReader, TrailerReader, reject_trailer, verify
+from stats import NULL_STATS
 
 
 class Huffman:
@@ -8,6 +16,15 @@ class Huffman:
     """
     char_bit_len = 8  # 字符bit位数
     num_bit_len = 32  # 数字bit位数(用来记录文本长度)
+    length_bit_len = 5  # 规范Huffman编码中, 记录"编码长度字段位数"的bit位数
+    table_bit_len = 11  # 解码查找表一次查看的bit位数
+    chunk_size = 1 << 16  # 解码时每次读入/写出的字节数
+    spool_size = 1 << 24  # 不能seek的输入, 暂存在内存中的最大字节数(超过则转存到临时文件)
+    pair_table_min = 1 << 18  # 输入不少于这么多字节时, 使用双字节编码表
+    block_size = 1 << 20  # 分块模式下每块的字节数
+    table_cache_size = 64  # 解压上下文(Decompressor)缓存的解码查找表个数
+    # 压缩文件格式: 文件头写Huffman树 / 只写编码长度 / 分块, 每块一张编码表 / 使用预训练字典中的编码表, 只写输入长度
+    modes = ('trie', 'canonical', 'block', 'static')
 
     class Node:
         """Huffman树的节点"""
@@ -26,6 +43,75 @@ class Huffman:
         def is_leaf(self):
             return self.left is None and self.right is None
 
+    class Compressor(object):
+        """
+        可重复使用的压缩上下文, 用于逐条压缩大量小消息: 参数检查和预训练字典编码表的加载只在创建时做一次.
+        'trie'/'canonical'/'block' 模式的编码表取决于每条消息的内容, 仍需每次构建.
+        创建后不再修改, 可以在多个线程中共用
+        """
+        def __init__(self, mode='trie', checksum=False, dictionary=None):
+            """
+            :param mode: 见 Huffman.compress
+            :param checksum: 见 Huffman.compress
+            :param dictionary: 见 Huffman.compress
+            """
+            if mode not in Huffman.modes:
+                raise ValueError('unknown Huffman mode: %r' % mode)
+            self.mode = mode
+            self.checksum = checksum
+            self.code_table = self.bits = None
+            if mode == 'static':
+                self.code_table = Huffman._static_table(dictionary, mode).code_table()
+                self.bits = Huffman._code_bits(self.code_table)
+
+        def compress(self, data, stats=None):
+            """压缩一条消息, 结果与相同参数的 Huffman.compress_bytes 相同"""
+            dst = io.BytesIO()
+            Huffman._compress_stream(io.BytesIO(data), dst, self.mode, self.checksum, stats, self.code_table, self.bits)
+            return dst.getvalue()
+
+    class Decompressor(object):
+        """
+        可重复使用的解压上下文: 由编码表构建的解码查找表按编码表缓存(LRU), 内容相近的消息编码表往往相同,
+        不必每次重建; 'static' 模式直接使用字典中的查找表. 查找表只读, 可以在多个线程中共用
+        """
+        def __init__(self, mode='trie', checksum=False, dictionary=None, cache_size=None):
+            """
+            :param mode: 见 Huffman.expand
+            :param checksum: 见 Huffman.expand
+            :param dictionary: 见 Huffman.expand
+            :param cache_size: 缓存的查找表个数, None表示 Huffman.table_cache_size
+            """
+            if mode not in Huffman.modes:
+                raise ValueError('unknown Huffman mode: %r' % mode)
+            self.mode = mode
+            self.checksum = checksum
+            self.dictionary = None
+            if mode == 'static':
+                self.dictionary = Huffman._static_table(dictionary, mode)
+                self.dictionary.decode_table()  # 预先构建
+            self.tables = lru_cache(cache_size or Huffman.table_cache_size)(self._new_table)
+
+        @staticmethod
+        def _new_table(items, k):
+            return Huffman._build_decode_table(dict(items), k)
+
+        def build(self, code_table, k):
+            """与 Huffman._build_decode_table 相同, 结果取自缓存"""
+            return self.tables(tuple(code_table.items()), k)
+
+        def expand(self, data, stats=None):
+            """解压一条消息, 返回解压后的字节"""
+            st = NULL_STATS if stats is None else stats
+            src = st.reader(io.BytesIO(data))
+            if self.checksum:
+                src = TrailerReader(src)
+            chunks = Huffman._expand_iter(src, self.mode, st, self.dictionary, None, self.build)
+            if self.checksum:
+                chunks = verify(chunks, src)
+            with st.stage('decode'):
+                return b''.join(chunks)
+
     @staticmethod
     def _build_trie(freq):
         """
@@ -61,100 +147,642 @@ class Huffman:
             Huffman._write_trie(node.right, writer)
 
     @staticmethod
-    def _build_code(code_table, node, s):
+    def _build_int_code(code_table, node, code, length):
         """
-        构建Huffman code映射表, lookup_table
+        构建整数形式的编码表, code_table[ch] = (编码, 编码长度)
         :param code_table: 编码表
         :param node: 根节点
-        :param s: 字符串
+        :param code: 当前编码
+        :param length: 当前编码长度
         :return:
         """
         if node.is_leaf():
-            code_table[node.ch] = s
+            code_table[node.ch] = (code, length)
         else:
-            Huffman._build_code(code_table, node.left, s + '0')
-            Huffman._build_code(code_table, node.right, s + '1')
+            Huffman._build_int_code(code_table, node.left, code << 1, length + 1)
+            Huffman._build_int_code(code_table, node.right, (code << 1) | 1, length + 1)
 
     @staticmethod
-    def _read_trie(reader):
-        is_leaf = reader.read_bit()
-        if is_leaf:
-            return Huffman.Node(reader.read_bits(Huffman.char_bit_len), 0, None, None)
-        else:
-            return Huffman.Node(None, 0, Huffman._read_trie(reader), Huffman._read_trie(reader))
+    def _code_bits(code_table):
+        """编码表 -> 每个字节的编码写成的'0'/'1'字符串(256项的列表)"""
+        bits = [''] * 256
+        for ch, (code, length) in code_table.items():
+            bits[ch] = format(code, '0%db' % length) if length else ''
+        return bits
+
+    @staticmethod
+    def _encode(code_table, chunks, text_len, writer, bits=None):
+        """
+        用编码表批量编码输入并写入
+        每个字符的编码预先转成'0'/'1'字符串, 一段输入拼接后用 int(s, 2) 一次性转成整数写入;
+        输入较长时使用双字节编码表(65536项), 每次查表编码两个字节
+        :param code_table: 编码表 {ch: (编码, 编码长度)}
+        :param chunks: 依次产出输入字节段的可迭代对象
+        :param text_len: 输入总长度
+        :param writer: 写入组件
+        :param bits: 预先由 _code_bits 得到的编码字符串, None表示现场转换
+        :return:
+        """
+        if bits is None:
+            bits = Huffman._code_bits(code_table)
+        pairs = None
+        if text_len >= Huffman.pair_table_min:
+            # array('H') 按本机字节序把相邻两个字节组成下标, 编码表也按同样的字节序构建
+            little = sys.byteorder == 'little'
+            pairs = [''] * 65536
+            for a in code_table:
+                for b in code_table:
+                    pairs[(b << 8) | a if little else (a << 8) | b] = bits[a] + bits[b]
+        rest = b''  # 双字节编码时, 上一段剩下的单个字节
+        for chunk in chunks:
+            if pairs is None:
+                s = ''.join(map(bits.__getitem__, chunk))
+            else:
+                if rest:
+                    chunk = rest + chunk
+                end = len(chunk) & ~1
+                rest = chunk[end:]
+                h = array('H')
+                h.frombytes(chunk[:end])
+                s = ''.join(map(pairs.__getitem__, h))
+            if s:
+                writer.write_bits(int(s, 2), len(s))
+        if rest:
+            s = bits[rest[0]]
+            writer.write_bits(int(s or '0', 2), len(s))
+
+    @staticmethod
+    def _build_decode_table(code_table, k):
+        """
+        由编码表构建k位查找表
+        一级表: 用接下来的k位作下标, 得到一个字符及其编码长度(编码长于k位时长度记0, 转查二级表)
+        多字符表: 同一下标, 得到k位内能完整解出的所有字符
+        二级表: 编码长于k位时, 用前k位找到二级表, 再用剩余位查表
+        :param code_table: 编码表 {ch: (编码, 编码长度)}
+        :param k: 一级表的bit位数
+        :return: (k, 最长编码长度, 一级表字符, 一级表长度, 二级表, 多字符表)
+        """
+        size = 1 << k
+        mask = size - 1
+        single_sym = [0] * size
+        single_len = [0] * size
+        long_codes = {}
+        max_len = 0
+        for ch, (code, length) in code_table.items():
+            max_len = max(max_len, length)
+            if length <= k:
+                start = code << (k - length)
+                for i in range(start, start + (1 << (k - length))):
+                    single_sym[i] = ch
+                    single_len[i] = length
+            else:
+                long_codes.setdefault(code >> (length - k), []).append((ch, code, length))
+
+        sub_tables = {}
+        for prefix, codes in long_codes.items():
+            w = max(length for _, _, length in codes) - k
+            sub_sym = [0] * (1 << w)
+            sub_len = [0] * (1 << w)
+            for ch, code, length in codes:
+                rest_len = length - k
+                start = (code & ((1 << rest_len) - 1)) << (w - rest_len)
+                for i in range(start, start + (1 << (w - rest_len))):
+                    sub_sym[i] = ch
+                    sub_len[i] = length
+            sub_tables[prefix] = (w, sub_sym, sub_len)
+
+        multi = [None] * size
+        for idx in range(size):
+            syms = []
+            pos = 0
+            while True:
+                length = single_len[(idx << pos) & mask]
+                if not length or pos + length > k:
+                    break
+                syms.append(single_sym[(idx << pos) & mask])
+                pos += length
+            multi[idx] = (bytes(syms), pos, len(syms))
+        return k, max_len, single_sym, single_len, sub_tables, multi
+
+    @staticmethod
+    def _decode(table, next_chunk, text_len, chunk_size=None):
+        """
+        查表解码, 生成器, 每次产出一段解码后的字节
+        :param table: _build_decode_table 构建的查找表
+        :param next_chunk: 每次调用返回压缩数据的下一段字节, 返回空表示输入结束
+        :param text_len: 需要解码的字符数
+        :param chunk_size: 每段产出的字节数(大约), None表示 Huffman.chunk_size
+        :return: (值, 比特数): 已从 next_chunk 取出但没有用到的比特, 输入提前结束时为(0, 0)
+        """
+        k, max_len, single_sym, single_len, sub_tables, multi = table
+        mask = (1 << k) - 1
+        need = max(max_len, k)  # 保证缓冲的比特足够解出任意一个编码
+        chunk_size = chunk_size or Huffman.chunk_size
+        acc, nbits = 0, 0
+        chunk, cpos = b'', 0
+        out = bytearray()
+        remaining = text_len
+        ended = False
+        while remaining:
+            while nbits < need:
+                if cpos >= len(chunk):
+                    chunk, cpos = next_chunk(), 0
+                    if not chunk:
+                        chunk = bytes(8)  # 输入已结束, 补0(压缩时末尾也是补0)
+                        ended = True
+                piece = chunk[cpos:cpos + 8]
+                cpos += 8
+                acc = ((acc & ((1 << nbits) - 1)) << (len(piece) << 3)) | int.from_bytes(piece, 'big')
+                nbits += len(piece) << 3
+            idx = (acc >> (nbits - k)) & mask
+            if remaining >= k:  # 多字符表的一项最多包含k个字符
+                syms, used, cnt = multi[idx]
+                if cnt:
+                    out += syms
+                    nbits -= used
+                    remaining -= cnt
+                    if len(out) >= chunk_size:
+                        yield bytes(out)
+                        out = bytearray()
+                    continue
+            length = single_len[idx]
+            if length:
+                out.append(single_sym[idx])
+            else:
+                w, sub_sym, sub_len = sub_tables[idx]
+                idx = (acc >> (nbits - k - w)) & ((1 << w) - 1)
+                out.append(sub_sym[idx])
+                length = sub_len[idx]
+            nbits -= length
+            remaining -= 1
+            if len(out) >= chunk_size:
+                yield bytes(out)
+                out = bytearray()
+        if out:
+            yield bytes(out)
+        if ended:
+            return 0, 0
+        tail = chunk[cpos:]
+        return (acc & ((1 << nbits) - 1)) << (len(tail) << 3) | int.from_bytes(tail, 'big'), nbits + (len(tail) << 3)
+
+    @staticmethod
+    def _read_trie_code(reader):
+        """
+        读取 _write_trie 写入的trie, 不构建Node, 直接得到编码表(与对trie调用 _build_int_code 的结果相同)
+        :param reader: 读取组件
+        :return: 编码表 {ch: (编码, 编码长度)}
+        """
+        code_table = {}
+        stack = [(0, 0)]  # 待读取的子树(编码, 编码长度), 先序遍历, 先左后右
+        internal = 0  # 内部节点数, 最多256个叶子, 所以最多255个内部节点
+        while stack:
+            code, length = stack.pop()
+            if reader.read_bit():
+                code_table[reader.read_bits(Huffman.char_bit_len)] = (code, length)
+            else:
+                internal += 1
+                if internal >= 1 << Huffman.char_bit_len:  # 损坏或截断的输入(读到结尾后全是0)
+                    raise ValueError('corrupt Huffman trie')
+                stack.append(((code << 1) | 1, length + 1))
+                stack.append((code << 1, length + 1))
+        return code_table
+
+    @staticmethod
+    def _code_lengths(freq):
+        """
+        不构建Node树, 直接用最小堆迭代地求出每个字符的Huffman编码长度
+        :param freq: 字母频率
+        :return: {ch: 编码长度}
+        """
+        symbols = list(freq)
+        parent = [0] * len(symbols)
+        min_heap = [(f, i) for i, f in enumerate(freq.values())]
+        heapq.heapify(min_heap)
+        while len(min_heap) > 1:
+            f1, i1 = heapq.heappop(min_heap)
+            f2, i2 = heapq.heappop(min_heap)
+            parent[i1] = parent[i2] = len(parent)
+            parent.append(0)
+            heapq.heappush(min_heap, (f1 + f2, len(parent) - 1))
+        # 内部节点的下标总大于其子节点, 倒序一遍即可求出所有深度
+        depth = [0] * len(parent)
+        for i in range(len(parent) - 2, -1, -1):
+            depth[i] = depth[parent[i]] + 1
+        return {ch: depth[i] for i, ch in enumerate(symbols)}
+
+    @staticmethod
+    def _canonical_code(lengths):
+        """
+        规范Huffman编码: 按(编码长度, 字符)排序后依次分配连续的编码
+        :param lengths: {ch: 编码长度}
+        :return: 编码表 {ch: (编码, 编码长度)}
+        """
+        code_table = {}
+        code, prev_len = 0, 0
+        for length, ch in sorted((length, ch) for ch, length in lengths.items()):
+            code <<= length - prev_len
+            code_table[ch] = (code, length)
+            code += 1
+            prev_len = length
+        return code_table
+
+    @staticmethod
+    def _write_lengths(lengths, writer):
+        """
+        写入规范Huffman的编码长度表:
+        字符个数-1(8位), 长度字段位数(5位), 然后按字符升序写入
+        (与上一个字符的差值的gamma编码, 编码长度)
+        :param lengths: {ch: 编码长度}
+        :param writer: 写入组件
+        :return:
+        """
+        width = max(max(lengths.values()).bit_length(), 1)
+        writer.write_bits(len(lengths) - 1, Huffman.char_bit_len)
+        writer.write_bits(width, Huffman.length_bit_len)
+        prev = -1
+        for ch in sorted(lengths):
+            writer.write_gamma(ch - prev)
+            writer.write_bits(lengths[ch], width)
+            prev = ch
+
+    @staticmethod
+    def _read_lengths(reader):
+        """读取 _write_lengths 写入的编码长度表"""
+        n = reader.read_bits(Huffman.char_bit_len) + 1
+        width = reader.read_bits(Huffman.length_bit_len)
+        lengths = {}
+        ch = -1
+        for i in range(n):
+            ch += reader.read_gamma()
+            lengths[ch] = reader.read_bits(width)
+        return lengths
+
+    @staticmethod
+    def _expand_codes(code_table, text_len, reader, stats=NULL_STATS, chunk_size=None, build=None):
+        """
+        根据编码表解码压缩文件余下的比特流, 生成器, 每次产出一段解码后的字节
+        :param code_table: 编码表 {ch: (编码, 编码长度)}
+        :param text_len: 字符数量
+        :param reader: 读取组件
+        :param stats: Stats 对象
+        :param chunk_size: 见 _decode
+        :param build: 由(编码表, k)构建查找表的函数, None表示 _build_decode_table
+        :return: 见 _decode
+        """
+        chunk_size = chunk_size or Huffman.chunk_size
+        if len(code_table) == 1:  # 只有一种字符, 编码长度为0
+            ch, = code_table
+            for start in range(0, text_len, chunk_size):
+                yield bytes([ch]) * min(chunk_size, text_len - start)
+            return 0, 0
+        # 输入较短时查找表不必比最长编码更宽, 减少建表开销
+        k = Huffman.table_bit_len
+        if text_len < 1 << k:
+            k = min(k, max(length for _, length in code_table.values()))
+        with stats.stage('build'):
+            table = (build or Huffman._build_decode_table)(code_table, k)
+        return (yield from Huffman._decode(table, lambda: reader.read_bytes(Huffman.chunk_size), text_len, chunk_size))
 
     @staticmethod
-    def compress(origin_filepath, compress_filepath):
+    def compress(origin_filepath, compress_filepath, mode='trie', checksum=False, stats=None, dictionary=None):
         """
         将``原始文件``压缩到``压缩文件``中
         :param origin_filepath: 原始文件
         :param compress_filepath: 压缩文件
-        :return: 没有返回值
-        """
-        # 统计频率(一轮读取)
-        freq = {}
-        text_len = 0
-        with open(origin_filepath, 'rb') as ori_f:
-            with BitReader(ori_f) as reader:
-                while True:
-                    ch = reader.read_bits(Huffman.char_bit_len)
-                    if not reader.read:
-                        break
-                    freq[ch] = freq.get(ch, 0) + 1
-                    text_len += 1
-
-        ori_f = open(origin_filepath, 'rb')
-        com_f = open(compress_filepath, 'wb')
-
-        with BitReader(ori_f) as reader:
-            with BitWriter(com_f) as writer:
-                root = Huffman._build_trie(freq)  # 构建Huffman树
-                code_table = {}
-                Huffman._build_code(code_table, root, '')  # 构建Huffman编码映射表
-                Huffman._write_trie(root, writer)  # 将trie写入压缩文件, 解压时用
-                writer.write_bits(text_len, Huffman.num_bit_len)  # 写入输入长度
+        :param mode: 'trie' 在文件头写入Huffman树; 'canonical' 只写入各字符的编码长度(规范Huffman编码);
+                     'block' 按块压缩, 每块单独统计频率, 与上一块相近时沿用上一块的编码表;
+                     'static' 使用预训练字典中的静态编码表, 只写入输入长度
+        :param checksum: 是否在压缩数据后追加原始数据的CRC32和长度, 解压时校验(压缩和解压需一致)
+        :param stats: Stats 对象, 记录各阶段耗时和计数(见 stats.py); None表示不统计
+        :param dictionary: 'static' 模式使用的预训练字典(dictionary.Dictionary 或其ID), 解压时需传入同一个字典
+        :return: stats
+        """
+        with open_input(origin_filepath) as ori_f, open(compress_filepath, 'wb') as com_f:
+            return Huffman.compress_stream(ori_f, com_f, mode, checksum, stats, dictionary)
 
-                # 使用Huffman code编码文件(二轮读取)
-                while True:
-                    ch = reader.read_bits(Huffman.char_bit_len)
-                    if not reader.read:
-                        break
-                    code = code_table[ch]
-                    for b in code:
-                        if b == '0':
-                            writer.write_bit(False)
-                        elif b == '1':
-                            writer.write_bit(True)
-                        else:
-                            raise Exception('Illegal state')
-        ori_f.close()
-        com_f.close()
-
-    @staticmethod
-    def expand(compress_filepath, origin_filepath):
+    @staticmethod
+    def expand(compress_filepath, origin_filepath, mode='trie', checksum=False, stats=None, dictionary=None):
         """
         将``压缩文件``, 解压写到``原始文件``中
         :param compress_filepath: 压缩文件
         :param origin_filepath: 原始文件
-        :return: 不返回任何值
+        :param mode: 压缩时使用的模式, 见 compress
+        :param checksum: 压缩时是否写入了校验尾部; 为True时校验失败抛出 ValueError
+        :param stats: 见 compress
+        :param dictionary: 压缩时使用的预训练字典, 见 compress
+        :return: stats
+        """
+        with open_input(compress_filepath) as com_f, open(origin_filepath, 'wb') as ori_f:
+            return Huffman.expand_stream(com_f, ori_f, mode, checksum, stats, dictionary)
+
+    @staticmethod
+    def compress_bytes(data, mode='trie', checksum=False, stats=None, dictionary=None):
+        """压缩内存中的字节, 返回压缩后的字节"""
+        dst = io.BytesIO()
+        Huffman.compress_stream(io.BytesIO(data), dst, mode, checksum, stats, dictionary)
+        return dst.getvalue()
+
+    @staticmethod
+    def expand_bytes(data, mode='trie', checksum=False, stats=None, dictionary=None):
+        """解压内存中的字节, 返回解压后的字节"""
+        dst = io.BytesIO()
+        Huffman.expand_stream(io.BytesIO(data), dst, mode, checksum, stats, dictionary)
+        return dst.getvalue()
+
+    @staticmethod
+    def compress_stream(src, dst, mode='trie', checksum=False, stats=None, dictionary=None):
+        """
+        从二进制文件对象 src 读取, 压缩后写入二进制文件对象 dst; 按段读写, 内存占用有界
+        :param src: 可读的二进制文件对象
+        :param dst: 可写的二进制文件对象
+        :param mode: 见 compress
+        :param checksum: 见 compress
+        :param stats: 见 compress
+        :param dictionary: 见 compress
+        :return: stats
+        """
+        if mode not in Huffman.modes:
+            raise ValueError('unknown Huffman mode: %r' % mode)
+        code_table = Huffman._static_table(dictionary, mode).code_table() if mode == 'static' else None
+        Huffman._compress_stream(src, dst, mode, checksum, stats, code_table)
+        return stats
+
+    @staticmethod
+    def _compress_stream(src, dst, mode, checksum, stats, code_table=None, bits=None):
+        """compress_stream 的实现, 参数已检查; code_table 是 'static' 模式的编码表, bits 见 _encode"""
+        st = NULL_STATS if stats is None else stats
+        src, dst = st.reader(src), st.writer(dst)
+        if checksum:
+            src = ChecksumReader(src)
+        if mode == 'block':  # 只读一轮, 不需要暂存输入
+            with st.bit_writer(BitWriter(dst)) as writer:
+                Huffman._compress_blocks(src, writer, st)
+        else:
+            Huffman._compress_two_pass(src, dst, mode, st, code_table, bits)
+        if checksum:
+            dst.write(src.trailer())
+
+    @staticmethod
+    def _compress_two_pass(src, dst, mode, stats, code_table=None, bits=None):
+        """
+        'trie'/'canonical'/'static' 模式: 第一轮统计频率('static' 模式只统计长度), 第二轮用 code_table(静态编码表)或新建的编码表编码.
+        src 不能 seek 时(管道, socket), 第一轮同时把输入暂存到临时文件
+        """
+        spool = None
+        if not (hasattr(src, 'seekable') and src.seekable()):
+            with stats.stage('spool'):
+                spool = src = Huffman._spool(src)
+        try:
+            # 统计频率(一轮读取, 保持字符首次出现的顺序)
+            with stats.stage('count'):
+                start = src.tell()
+                freq = Counter()
+                text_len = 0
+                for chunk in iter_chunks(src, Huffman.chunk_size):
+                    if code_table is None:
+                        freq.update(chunk)
+                    text_len += len(chunk)
+                freq = freq or {0: 0}  # 空文件当作只有一种字符
+                src.seek(start)
+            stats.add('symbols', text_len)
+
+            with stats.bit_writer(BitWriter(dst)) as writer:
+                if mode == 'static':
+                    with stats.stage('header'):
+                        writer.write_gamma(text_len + 1)  # 编码表在字典中, 只写入输入长度
+                elif mode == 'canonical':
+                    with stats.stage('build'):
+                        lengths = Huffman._code_lengths(freq)
+                        code_table = Huffman._canonical_code(lengths)  # 构建规范Huffman编码表
+                    with stats.stage('header'):
+                        Huffman._write_lengths(lengths, writer)  # 只写入编码长度, 解压时据此重建编码
+                        writer.write_gamma(text_len + 1)  # 输入长度(gamma编码, 没有32位的限制)
+                else:
+                    with stats.stage('build'):
+                        root = Huffman._build_trie(freq)  # 构建Huffman树
+                        code_table = {}
+                        Huffman._build_int_code(code_table, root, 0, 0)  # 构建Huffman编码映射表
+                    with stats.stage('header'):
+                        Huffman._write_trie(root, writer)  # 将trie写入压缩文件, 解压时用
+                        writer.write_bits(text_len, Huffman.num_bit_len)  # 写入输入长度
+                # 使用Huffman code编码文件(二轮读取)
+                with stats.stage('encode'):
+                    Huffman._encode(code_table, iter_chunks(src, Huffman.chunk_size), text_len, writer, bits)
+        finally:
+            if spool is not None:
+                spool.close()
+
+    @staticmethod
+    def _compress_blocks(src, writer, stats=NULL_STATS):
+        """
+        分块压缩, 每块:
+        块长度+1(gamma, 为1表示结束), 是否使用新编码表(1位), [编码长度表],
+        压缩数据字节数+1(gamma), 补0到字节边界, 压缩数据.
+        每块写完就输出, 内存占用只与块大小有关; 长度都用gamma编码, 输入大小没有限制
+        :param src: 可读的二进制文件对象
+        :param writer: 写入组件
+        :param stats: Stats 对象
+        :return:
+        """
+        lengths = None  # 上一块的编码长度
+        code_table = None
+        while True:
+            block = Huffman._read_block(src, Huffman.block_size)
+            writer.write_gamma(len(block) + 1)
+            if not block:
+                break
+            stats.add('blocks')
+            stats.add('symbols', len(block))
+            with stats.stage('count'):
+                freq = Counter(block)
+            with stats.stage('build'):
+                new_lengths = Huffman._code_lengths(freq)
+                new_cost = Huffman._lengths_cost(new_lengths) + sum(freq[ch] * n for ch, n in new_lengths.items())
+                reuse = lengths is not None and freq.keys() <= lengths.keys() \
+                    and sum(f * lengths[ch] for ch, f in freq.items()) <= new_cost
+                if not reuse:
+                    lengths = new_lengths
+                    code_table = Huffman._canonical_code(lengths)
+            with stats.stage('header'):
+                if not reuse:
+                    writer.write_bit(True)
+                    Huffman._write_lengths(lengths, writer)
+                else:  # 沿用上一块的编码表(比重新写一张表更省)
+                    writer.write_bit(False)
+                    stats.add('tables_reused')
+            with stats.stage('encode'):
+                payload = io.BytesIO()
+                with stats.bit_writer(BitWriter(payload)) as block_writer:
+                    Huffman._encode(code_table, (block,), len(block), block_writer)
+                payload = payload.getvalue()
+            writer.write_gamma(len(payload) + 1)
+            writer.flush()  # 补0到字节边界并输出
+            writer.write_bytes(payload)
+            writer.flush()
+
+    @staticmethod
+    def _lengths_cost(lengths):
+        """_write_lengths 写入编码长度表需要的比特数"""
+        width = max(max(lengths.values()).bit_length(), 1)
+        cost = Huffman.char_bit_len + Huffman.length_bit_len + width * len(lengths)
+        prev = -1
+        for ch in sorted(lengths):
+            cost += 2 * (ch - prev).bit_length() - 1
+            prev = ch
+        return cost
+
+    @staticmethod
+    def _read_block(src, size):
+        """读取 size 个字节, 流式输入一次 read 可能不足, 读满或读到结尾为止"""
+        block = src.read(size)
+        if not block or len(block) >= size:  # 文件输入一次就能读满, 不必复制
+            return block
+        buf = bytearray(block)
+        while len(buf) < size:
+            more = src.read(size - len(buf))
+            if not more:
+                break
+            buf += more
+        return bytes(buf)
+
+    @staticmethod
+    def _expand_blocks(reader, stats=NULL_STATS, chunk_size=None, build=None):
+        """
+        解压分块模式的压缩数据, 生成器, 每次产出一段解压后的字节
+        :param reader: 读取组件
+        :param stats: Stats 对象
+        :param chunk_size: 见 _decode
+        :param build: 见 _expand_codes
+        :return:
+        """
+        chunk_size = chunk_size or Huffman.chunk_size
+        build = build or Huffman._build_decode_table
+        code_table = table = None
+        while True:
+            text_len = reader.read_gamma() - 1
+            if text_len <= 0:  # 结束标记(或输入已结束)
+                return
+            stats.add('blocks')
+            stats.add('symbols', text_len)
+            if reader.read_bit():
+                with stats.stage('build'):
+                    code_table = Huffman._canonical_code(Huffman._read_lengths(reader))
+                    table = None
+                    if len(code_table) > 1:
+                        table = build(code_table, Huffman.table_bit_len)
+            elif code_table is None:
+                raise ValueError('corrupt Huffman block: missing code table')
+            else:
+                stats.add('tables_reused')
+            size = reader.read_gamma() - 1
+            reader.read_bits(reader.bcount & 7)  # 跳过补齐字节边界的0
+            payload = reader.read_bytes(size)
+            if table is None:  # 只有一种字符, 编码长度为0
+                ch, = code_table
+                for start in range(0, text_len, chunk_size):
+                    yield bytes([ch]) * min(chunk_size, text_len - start)
+            else:
+                chunks = iter((payload,))
+                yield from Huffman._decode(table, lambda: next(chunks, b''), text_len, chunk_size)
+
+    @staticmethod
+    def _static_table(dictionary, mode):
+        """取出 'static' 模式使用的预训练字典"""
+        if dictionary is None:
+            raise ValueError('Huffman mode %r requires a dictionary' % mode)
+        from dictionary import get  # dictionary 模块依赖本模块, 用到时才导入
+        return get(dictionary)
+
+    @staticmethod
+    def _spool(src):
+        """把不能 seek 的输入暂存起来(小输入在内存中, 大输入在临时文件中)"""
+        spool = tempfile.SpooledTemporaryFile(max_size=Huffman.spool_size)
+        for chunk in iter_chunks(src, Huffman.chunk_size):
+            spool.write(chunk)
+        spool.seek(0)
+        return spool
+
+    @staticmethod
+    def expand_stream(src, dst, mode='trie', checksum=False, stats=None, dictionary=None):
         """
-        com_f = open(compress_filepath, 'rb')
-        ori_f = open(origin_filepath, 'wb')
+        从二进制文件对象 src 读取压缩数据, 解压后写入二进制文件对象 dst
+        :param src: 可读的二进制文件对象
+        :param dst: 可写的二进制文件对象
+        :param mode: 压缩时使用的模式, 见 compress
+        :param checksum: 见 expand
+        :param stats: 见 compress
+        :param dictionary: 见 expand
+        :return: stats
+        """
+        st = NULL_STATS if stats is None else stats
+        src, dst = st.reader(src), st.writer(dst)
+        if checksum:
+            src = TrailerReader(src)
+        chunks = Huffman._expand_iter(src, mode, st, dictionary)
+        if checksum:
+            chunks = verify(chunks, src)
+        with st.stage('decode'):
+            for data in chunks:
+                dst.write(data)
+        return stats
 
-        with BitReader(com_f) as reader:
-            with BitWriter(ori_f) as writer:
-                root = Huffman._read_trie(reader)
+    @staticmethod
+    def iter_expand(src, chunk_size=BUFFER_SIZE, mode='trie', checksum=False, stats=None, dictionary=None):
+        """
+        惰性解压, 生成器, 每次产出不超过 chunk_size 的一段解压后的字节.
+        只在使用方取下一段时才继续读取和解码压缩数据, 使用方停止迭代(或调用 close)后不再读取输入,
+        适合预览文件开头, 或扫描到某个标记为止; 输入是文件路径时, 生成器结束或关闭时关闭文件.
+        :param src: 压缩文件路径, 或可读的二进制文件对象
+        :param chunk_size: 每段的最大字节数, 也决定了每次解码多少数据
+        :param mode: 压缩时使用的模式, 见 compress
+        :param checksum: 见 expand; 只有迭代到结尾时才会校验
+        :param stats: 见 compress, 随迭代累计
+        :param dictionary: 见 expand
+        :return:
+        """
+        if not hasattr(src, 'read'):
+            with open_input(src) as f:
+                yield from Huffman.iter_expand(f, chunk_size, mode, checksum, stats, dictionary)
+            return
+        st = NULL_STATS if stats is None else stats
+        src = st.reader(src)
+        if checksum:
+            src = TrailerReader(src)
+        chunks = Huffman._expand_iter(src, mode, st, dictionary, chunk_size)
+        if checksum:
+            chunks = verify(chunks, src)
+        yield from split_chunks(chunks, chunk_size)
+
+    @staticmethod
+    def _expand_iter(src, mode, stats=NULL_STATS, dictionary=None, chunk_size=None, build=None):
+        """
+        解压 src, 生成器, 每次产出一段(大约 chunk_size 字节, None表示 Huffman.chunk_size)解压后的字节;
+        build 见 _expand_codes
+        """
+        if mode not in Huffman.modes:
+            raise ValueError('unknown Huffman mode: %r' % mode)
+        reader = stats.bit_reader(BitReader(src))
+        if mode == 'block':
+            yield from Huffman._expand_blocks(reader, stats, chunk_size, build)
+            reject_trailer(reader)
+            return
+        if mode == 'static':  # 解码查找表已缓存在字典中, 不必每次重建
+            table = Huffman._static_table(dictionary, mode).decode_table()
+            text_len = reader.read_gamma() - 1
+            stats.add('symbols', text_len)
+            unused = yield from Huffman._decode(table, lambda: reader.read_bytes(Huffman.chunk_size), text_len, chunk_size)
+            reject_trailer(reader, *unused)
+            return
+        with stats.stage('header'):
+            if mode == 'canonical':
+                code_table = Huffman._canonical_code(Huffman._read_lengths(reader))
+                text_len = reader.read_gamma() - 1
+            else:
+                code_table = Huffman._read_trie_code(reader)
                 text_len = reader.read_bits(Huffman.num_bit_len)
-                for i in range(text_len):
-                    x = root
-                    while not x.is_leaf():
-                        if reader.read_bit():
-                            x = x.right
-                        else:
-                            x = x.left
-                    writer.write_bits(x.ch, Huffman.char_bit_len)
-        com_f.close()
-        ori_f.close()
+        stats.add('symbols', text_len)
+        unused = yield from Huffman._expand_codes(code_table, text_len, reader, stats, chunk_size, build)
+        reject_trailer(reader, *unused)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,470 @@
+import io
+from array import array
+from itertools import repeat
+
+from bitio import BUFFER_SIZE, BitReader, BitWriter, iter_chunks, open_input, split_chunks
+from checksum import ChecksumReader, TrailerReader, reject_trailer, verify
+from Huffman import Huffman
+from stats import NULL_STATS
+
+
+class LZSS:
+    """
+    LZSS(LZ77)滑动窗口压缩: 在之前的最多 2^window_bits - 1 个字节中找与当前位置开始的字节串最长的匹配,
+    输出(长度, 距离)代替这段字节, 找不到不短于 min_match 的匹配时输出字面字节.
+    与LZW不同, 它可以引用窗口内任意位置的数据, 不受符号表大小的限制.
+
+    匹配查找使用哈希链: 每个位置按开头3个字节的哈希值插入链表头(head), 同一哈希值的前一个位置记在 prev 中,
+    沿链表回溯最多 max_chain 个候选位置.
+    """
+    min_match = 3  # 最短匹配长度, 也是哈希的字节数
+    max_match = min_match + 255  # 最长匹配长度, 长度减 min_match 用8位表示
+    window_bits = 16  # 默认窗口: 64KiB
+    min_window_bits = 8
+    max_window_bits = 16
+    max_chain = 128  # 每个位置最多检查的候选匹配数
+    good_match = 8  # 推迟的匹配已有这么长时, 下一个位置只检查 1/4 的候选
+    nice_match = max_match  # 找到这么长的匹配就不再继续查找
+    lazy = 32  # 当前匹配短于这个长度时, 检查下一个位置是否有更长的匹配(0表示贪心匹配)
+    too_far = 4096  # 长度为 min_match 的匹配距离超过这个值时不使用, 编码后比3个字面字节还长
+    chunk_size = 1 << 16  # 每次处理的字节数
+    block_tokens = 1 << 18  # 'huffman' 模式每块的记号数
+    modes = ('bits', 'huffman')  # 标记位+字面字节/(长度, 距离)直接写成比特流 / 记号拆成几个字节流, 分别用Huffman编码
+
+    @staticmethod
+    def compress(origin_filepath, compress_filepath, mode='huffman', window_bits=window_bits, lazy=lazy,
+                 max_chain=max_chain, checksum=False, stats=None):
+        """
+        将``原始文件``压缩到``压缩文件``中
+        :param origin_filepath: 原始文件
+        :param compress_filepath: 压缩文件
+        :param mode: 'bits' 每个记号写成标记位+8位字面字节, 或标记位+8位长度+window_bits位距离;
+                     'huffman' 记号分块, 块内的标记, 字面字节, 长度, 距离分成几个字节流, 分别用规范Huffman编码(默认)
+        :param window_bits: 窗口大小的位数, 在 [min_window_bits, max_window_bits] 之间, 记录在压缩文件的第一个字节
+        :param lazy: 惰性匹配: 当前匹配短于 lazy 时, 若下一个位置的匹配更长, 就先输出一个字面字节; 0表示贪心匹配
+        :param max_chain: 每个位置沿哈希链最多检查的候选匹配数, 越大压缩率越高, 速度越慢
+        :param checksum: 是否在压缩数据后追加原始数据的CRC32和长度, 解压时校验(压缩和解压需一致)
+        :param stats: Stats 对象, 记录各阶段耗时和计数(见 stats.py); None表示不统计
+        :return: stats
+        """
+        with open_input(origin_filepath) as ori_f, open(compress_filepath, 'wb') as com_f:
+            return LZSS.compress_stream(ori_f, com_f, mode, window_bits, lazy, max_chain, checksum, stats)
+
+    @staticmethod
+    def compress_bytes(data, mode='huffman', window_bits=window_bits, lazy=lazy, max_chain=max_chain, checksum=False,
+                       stats=None):
+        """压缩内存中的字节, 返回压缩后的字节"""
+        dst = io.BytesIO()
+        LZSS.compress_stream(io.BytesIO(data), dst, mode, window_bits, lazy, max_chain, checksum, stats)
+        return dst.getvalue()
+
+    @staticmethod
+    def compress_stream(src, dst, mode='huffman', window_bits=window_bits, lazy=lazy, max_chain=max_chain,
+                        checksum=False, stats=None):
+        """
+        从二进制文件对象 src 按段读取, 压缩后写入二进制文件对象 dst; 内存占用只与窗口大小有关
+        :param src: 可读的二进制文件对象
+        :param dst: 可写的二进制文件对象
+        :param mode: 见 compress
+        :param window_bits: 见 compress
+        :param lazy: 见 compress
+        :param max_chain: 见 compress
+        :param checksum: 见 compress
+        :param stats: 见 compress
+        :return: stats
+        """
+        if mode not in LZSS.modes:
+            raise ValueError('unknown LZSS mode: %r' % mode)
+        if not LZSS.min_window_bits <= window_bits <= LZSS.max_window_bits:
+            raise ValueError('window_bits must be in [%d, %d]' % (LZSS.min_window_bits, LZSS.max_window_bits))
+        st = NULL_STATS if stats is None else stats
+        src, dst = st.reader(src), st.writer(dst)
+        if checksum:
+            src = ChecksumReader(src)
+        with st.bit_writer(BitWriter(dst)) as writer, st.stage('encode'):
+            writer.write_bits(window_bits, 8)
+            tokens = LZSS._tokens(iter_chunks(src, LZSS.chunk_size), window_bits, lazy, max_chain, st)
+            if mode == 'huffman':
+                LZSS._write_blocks(tokens, writer, st)
+            else:
+                LZSS._write_tokens(tokens, writer, window_bits)
+        if checksum:
+            dst.write(src.trailer())
+        return stats
+
+    @staticmethod
+    def _tokens(chunks, window_bits, lazy, max_chain, stats=NULL_STATS):
+        """
+        查找匹配, 生成器, 每段输入产出一组记号: 小于256的是字面字节, 否则是 256 + ((长度 - min_match) << 16 | 距离).
+        哈希链以开头3个字节本身为键(head 是字典, 没有哈希冲突), prev[位置 & wmask] 是同一前缀的前一个位置;
+        每个位置都插入哈希链, 字面字节的位置也可以被之后的匹配引用.
+        记号只由输入本身决定, 与输入如何分段读入无关: 每段只编码到距末尾 lookahead 之前, 匹配总能看到完整的后续数据
+        :param chunks: 依次产出输入字节段的可迭代对象
+        :param window_bits: 窗口大小的位数
+        :param lazy: 见 compress
+        :param max_chain: 见 compress
+        :param stats: Stats 对象, 记录字面字节数和匹配数
+        :return:
+        """
+        min_match, max_match = LZSS.min_match, LZSS.max_match
+        good_match, nice_match = LZSS.good_match, LZSS.nice_match
+        window = (1 << window_bits) - 1  # 最大距离, 距离0留作结束标记
+        wmask = (1 << window_bits) - 1
+        too_far = LZSS.too_far
+        head = {}  # 3字节前缀 -> 最近的位置
+        prev = array('l', [-1]) * (1 << window_bits)  # 位置 & wmask -> 同一前缀的前一个位置
+        data = b''  # 窗口内的历史数据 + 尚未编码的数据
+        base = 0  # data[0] 在输入中的位置
+        pos = 0  # 下一个要查找的位置
+        pending = 0, 0  # 推迟输出的匹配(长度, 距离), 从 pos - 1 开始; 长度0表示没有
+
+        def longest(j, cand, best):
+            """沿哈希链找 data[j:] 中比 best 更长的最长匹配, 返回(长度, 距离); 没有时返回(0, 0)"""
+            d = data
+            p = base + j
+            low = p - window
+            max_len = min(max_match, len(d) - j)
+            if best >= max_len:
+                return 0, 0
+            best_dist = 0
+            chain = max_chain >> 2 if best >= good_match else max_chain  # 已有不错的匹配时少查一些候选
+            while cand >= 0 and cand >= low and chain:
+                k = cand - base
+                # 先用一次切片比较排除不可能更长的候选, 再逐段延长
+                if d[k + best] == d[j + best] and d[k:k + best] == d[j:j + best]:
+                    n = best + 1
+                    while n + 8 <= max_len and d[k + n:k + n + 8] == d[j + n:j + n + 8]:
+                        n += 8
+                    while n < max_len and d[k + n] == d[j + n]:
+                        n += 1
+                    if n > best:
+                        best, best_dist = n, p - cand
+                        if n >= nice_match or n == max_len:
+                            break
+                cand = prev[cand & wmask]
+                chain -= 1
+            if not best_dist or (best == min_match and best_dist > too_far):
+                return 0, 0
+            return best, best_dist
+
+        def encode(limit, final):
+            """编码从 pos 到 limit 的记号(最后一个匹配可以越过 limit), final 为True时输出推迟的匹配"""
+            nonlocal pos, pending
+            d = data
+            b = base
+            n = len(d)
+            get = head.get
+            tokens = []
+            append = tokens.append
+            matches = 0
+            prev_len, prev_dist = pending
+            j = pos - b
+            end = limit - b
+            while j < end:
+                # 插入当前位置, 查找匹配
+                cur_len = 0
+                if j + min_match <= n:
+                    key = d[j:j + min_match]
+                    cand = get(key, -1)
+                    head[key] = b + j
+                    prev[(b + j) & wmask] = cand
+                    if cand >= b + j - window:
+                        cur_len, cur_dist = longest(j, cand, max(prev_len, min_match - 1))
+                if prev_len:
+                    if cur_len > prev_len:  # 当前位置的匹配更长: 上一个位置改为字面字节
+                        append(d[j - 1])
+                        if cur_len < lazy:
+                            prev_len, prev_dist = cur_len, cur_dist
+                            j += 1
+                            continue
+                        prev_len = 0
+                        start, length, dist = j, cur_len, cur_dist
+                    else:  # 输出推迟的匹配
+                        start, length, dist = j - 1, prev_len, prev_dist
+                        prev_len = 0
+                elif cur_len < min_match:
+                    append(d[j])
+                    j += 1
+                    continue
+                elif cur_len < lazy:  # 推迟输出, 先看下一个位置是否有更长的匹配
+                    prev_len, prev_dist = cur_len, cur_dist
+                    j += 1
+                    continue
+                else:
+                    start, length, dist = j, cur_len, cur_dist
+                append(256 + ((length - min_match) << 16 | dist))
+                matches += 1
+                # 匹配内部的位置也插入哈希链(不足3个字节的除外). 整段批量插入:
+                # 段内重复的前缀都链到插入前的位置(略过段内较早的那个), 换来不必逐个位置执行Python代码
+                stop = min(start + length, n - min_match + 1)
+                if stop > j + 1:
+                    keys = [d[k:k + min_match] for k in range(j + 1, stop)]
+                    old = array('l', map(get, keys, repeat(-1)))
+                    head.update(zip(keys, range(b + j + 1, b + stop)))
+                    lo, hi = (b + j + 1) & wmask, (b + stop - 1) & wmask
+                    if lo <= hi:
+                        prev[lo:hi + 1] = old
+                    else:  # 跨过 prev 的末尾
+                        prev[lo:] = old[:wmask + 1 - lo]
+                        prev[:hi + 1] = old[wmask + 1 - lo:]
+                j = start + length
+            if final and prev_len:
+                append(256 + ((prev_len - min_match) << 16 | prev_dist))
+                matches += 1
+                prev_len = 0
+            pos = b + j
+            pending = prev_len, prev_dist
+            stats.add('matches', matches)
+            stats.add('literals', len(tokens) - matches)
+            return tokens
+
+        lookahead = max_match + min_match  # 未到输入结尾时, 保证匹配和其中插入的位置都有足够的后续数据
+        for chunk in chunks:
+            keep = max(base, pos - 1 - window)
+            data = data[keep - base:] + chunk
+            base = keep
+            if len(head) > 4 << window_bits:  # 删掉已经滑出窗口的前缀, 内存只与窗口大小有关
+                low = pos - window
+                head = {key: p for key, p in head.items() if p >= low}
+            tokens = encode(base + len(data) - lookahead, False)
+            if tokens:
+                yield tokens
+        tokens = encode(base + len(data), True)
+        if tokens:
+            yield tokens
+
+    @staticmethod
+    def _write_tokens(tokens, writer, window_bits):
+        """
+        'bits' 模式: 字面字节写成 0 + 8位; 匹配写成 1 + 8位(长度 - min_match) + window_bits位距离;
+        最后写入距离为0的匹配作为结束标记
+        :param tokens: _tokens 产出的记号
+        :param writer: 写入组件
+        :param window_bits: 窗口大小的位数
+        :return:
+        """
+        write_bits = writer.write_bits
+        match_bits = 9 + window_bits
+        flag = 1 << (8 + window_bits)
+        dist_mask = (1 << 16) - 1
+        for group in tokens:
+            for t in group:
+                if t < 256:
+                    write_bits(t, 9)
+                else:
+                    t -= 256
+                    write_bits(flag | (t >> 16) << window_bits | (t & dist_mask), match_bits)
+        write_bits(flag, match_bits)
+
+    @staticmethod
+    def _write_blocks(tokens, writer, stats=NULL_STATS):
+        """
+        'huffman' 模式: 每 block_tokens 个记号一块, 块内的记号拆成5个字节流:
+        标记(每个记号1位, 1表示匹配), 字面字节, 匹配长度 - min_match, 距离高8位, 距离低8位,
+        各自的统计特征不同, 分别用规范Huffman编码(Huffman 'canonical' 模式).
+        每块: 记号数+1(gamma, 为1表示结束), 5个流各自的 压缩后字节数+1(gamma) 和压缩数据
+        :param tokens: _tokens 产出的记号
+        :param writer: 写入组件
+        :param stats: Stats 对象
+        :return:
+        """
+        size = LZSS.block_tokens
+        block = []
+        for group in tokens:
+            block += group
+            while len(block) >= size:  # 按记号数分块, 与每次读入多少数据无关
+                LZSS._write_block(block[:size], writer, stats)
+                del block[:size]
+        if block:
+            LZSS._write_block(block, writer, stats)
+        writer.write_gamma(1)
+
+    @staticmethod
+    def _write_block(block, writer, stats=NULL_STATS):
+        flags = ''.join(['1' if t >= 256 else '0' for t in block])
+        flags = int(flags.ljust((len(flags) + 7) & ~7, '0'), 2).to_bytes((len(flags) + 7) >> 3, 'big')
+        matches = [t - 256 for t in block if t >= 256]
+        streams = (flags, bytes([t for t in block if t < 256]), bytes([t >> 16 for t in matches]),
+                   bytes([t >> 8 & 0xFF for t in matches]), bytes([t & 0xFF for t in matches]))
+        writer.write_gamma(len(block) + 1)
+        stats.add('blocks')
+        for stream in streams:
+            payload = Huffman.compress_bytes(stream, 'canonical') if stream else b''
+            writer.write_gamma(len(payload) + 1)
+            writer.write_bytes(payload)
+
+    @staticmethod
+    def _read_blocks(reader):
+        """'huffman' 模式的记号, 生成器, 每块产出一组(字面字节 或 (长度, 距离))"""
+        min_match = LZSS.min_match
+        while True:
+            count = reader.read_gamma() - 1
+            if count <= 0:  # 结束标记(或输入已结束)
+                reject_trailer(reader)
+                return
+            flags, literals, lengths, high, low = [
+                Huffman.expand_bytes(reader.read_bytes(reader.read_gamma() - 1), 'canonical') for _ in range(5)]
+            flags = format(int.from_bytes(flags, 'big'), '0%db' % (len(flags) * 8))[:count]
+            if (len(flags) < count or flags.count('1') != len(lengths) or len(literals) != count - len(lengths)
+                    or len(high) != len(lengths) or len(low) != len(lengths)):
+                raise ValueError('corrupt LZSS block')
+            literals = iter(literals)
+            matches = zip([n + min_match for n in lengths], [h << 8 | l for h, l in zip(high, low)])
+            yield [next(matches) if f == '1' else next(literals) for f in flags]
+
+    @staticmethod
+    def expand(compress_filepath, origin_filepath, mode='huffman', checksum=False, stats=None):
+        """
+        将``压缩文件``, 解压写到``原始文件``中
+        :param compress_filepath: 压缩文件
+        :param origin_filepath: 原始文件
+        :param mode: 压缩时使用的模式, 见 compress; 窗口大小从文件头读取
+        :param checksum: 压缩时是否写入了校验尾部; 为True时校验失败抛出 ValueError
+        :param stats: 见 compress
+        :return: stats
+        """
+        with open_input(compress_filepath) as com_f, open(origin_filepath, 'wb') as ori_f:
+            return LZSS.expand_stream(com_f, ori_f, mode, checksum, stats)
+
+    @staticmethod
+    def expand_bytes(data, mode='huffman', checksum=False, stats=None):
+        """解压内存中的字节, 返回解压后的字节"""
+        dst = io.BytesIO()
+        LZSS.expand_stream(io.BytesIO(data), dst, mode, checksum, stats)
+        return dst.getvalue()
+
+    @staticmethod
+    def expand_stream(src, dst, mode='huffman', checksum=False, stats=None):
+        """
+        从二进制文件对象 src 读取压缩数据, 解压后按段写入二进制文件对象 dst
+        :param src: 可读的二进制文件对象
+        :param dst: 可写的二进制文件对象
+        :param mode: 压缩时使用的模式, 见 compress
+        :param checksum: 见 expand
+        :param stats: 见 compress
+        :return: stats
+        """
+        st = NULL_STATS if stats is None else stats
+        src, dst = st.reader(src), st.writer(dst)
+        if checksum:
+            src = TrailerReader(src)
+        chunks = LZSS._expand_iter(src, mode, st)
+        if checksum:
+            chunks = verify(chunks, src)
+        with st.stage('decode'):
+            for data in chunks:
+                dst.write(data)
+        return stats
+
+    @staticmethod
+    def iter_expand(src, chunk_size=BUFFER_SIZE, mode='huffman', checksum=False, stats=None):
+        """
+        惰性解压, 生成器, 每次产出不超过 chunk_size 的一段解压后的字节.
+        只在使用方取下一段时才继续读取和解码压缩数据, 使用方停止迭代(或调用 close)后不再读取输入,
+        适合预览文件开头, 或扫描到某个标记为止; 输入是文件路径时, 生成器结束或关闭时关闭文件.
+        :param src: 压缩文件路径, 或可读的二进制文件对象
+        :param chunk_size: 每段的最大字节数, 也决定了每次解码多少数据
+        :param mode: 压缩时使用的模式, 见 compress
+        :param checksum: 见 expand; 只有迭代到结尾时才会校验
+        :param stats: 见 compress, 随迭代累计
+        :return:
+        """
+        if not hasattr(src, 'read'):
+            with open_input(src) as f:
+                yield from LZSS.iter_expand(f, chunk_size, mode, checksum, stats)
+            return
+        st = NULL_STATS if stats is None else stats
+        src = st.reader(src)
+        if checksum:
+            src = TrailerReader(src)
+        chunks = LZSS._expand_iter(src, mode, st, chunk_size)
+        if checksum:
+            chunks = verify(chunks, src)
+        yield from split_chunks(chunks, chunk_size)
+
+    @staticmethod
+    def _expand_iter(src, mode, stats=NULL_STATS, chunk_size=None):
+        """解压 src, 生成器, 每次产出一段(大约 chunk_size 字节, None表示 LZSS.chunk_size)解压后的字节"""
+        if mode not in LZSS.modes:
+            raise ValueError('unknown LZSS mode: %r' % mode)
+        reader = stats.bit_reader(BitReader(src))
+        window_bits = reader.read_bits(8)
+        if not reader.read:
+            return iter(())
+        if not LZSS.min_window_bits <= window_bits <= LZSS.max_window_bits:
+            raise ValueError('corrupt LZSS data: window_bits %d' % window_bits)
+        if mode == 'huffman':
+            tokens = LZSS._read_blocks(reader)
+        else:
+            tokens = LZSS._read_tokens(reader, window_bits)
+        return LZSS._decode(tokens, 1 << window_bits, stats, chunk_size)
+
+    @staticmethod
+    def _read_tokens(reader, window_bits):
+        """'bits' 模式的记号, 生成器, 每次产出一组(字面字节 或 (长度, 距离))"""
+        read_bits = reader.read_bits
+        min_match = LZSS.min_match
+        group = []
+        while True:
+            t = read_bits(9)
+            if not reader.read:  # 没有结束标记的截断输入, 与其他算法一样解出已有的部分
+                break
+            if t < 256:
+                group.append(t)
+            else:
+                dist = read_bits(window_bits)
+                if not dist or not reader.read:  # 结束标记
+                    break
+                group.append((t - 256 + min_match, dist))
+            if len(group) >= 4096:
+                yield group
+                group = []
+        yield group
+        reject_trailer(reader)
+
+    @staticmethod
+    def _decode(tokens, window, stats=NULL_STATS, chunk_size=None):
+        """
+        由记号重建数据, 生成器. 每个匹配从已输出的数据中一次切片复制;
+        距离小于长度(重叠)时, 复制的是以距离为周期的重复片段
+        :param tokens: 产出一组(字面字节 或 (长度, 距离))的可迭代对象
+        :param window: 窗口大小, 输出中只需保留最后 window 个字节供后续匹配引用
+        :param stats: Stats 对象, 记录字面字节数和匹配数
+        :param chunk_size: 每段产出的字节数(大约), None表示 LZSS.chunk_size
+        :return:
+        """
+        chunk_size = chunk_size or LZSS.chunk_size
+        out = bytearray()
+        sent = 0  # out 中已经产出的字节数
+        for group in tokens:
+            matches = 0
+            for t in group:
+                if t.__class__ is int:
+                    out.append(t)
+                    continue
+                length, dist = t
+                start = len(out) - dist
+                if start < 0:
+                    raise ValueError('corrupt LZSS data: distance %d beyond output' % dist)
+                if dist >= length:
+                    out += out[start:start + length]
+                else:
+                    out += (out[start:] * (length // dist + 1))[:length]
+                matches += 1
+            stats.add('matches', matches)
+            stats.add('literals', len(group) - matches)
+            if len(out) - sent >= chunk_size:
+                yield bytes(out[sent:])
+                if len(out) >= window + LZSS.chunk_size:  # 只保留窗口内的数据
+                    del out[:-window]
+                sent = len(out)
+        if len(out) > sent:
+            yield bytes(out[sent:])
+
+
+if __name__ == '__main__':
+    src_fp = 'data/medTale.txt'
+    com_fp = 'temp_files/medTale.txt.lzss'
+    exp_fp = 'temp_files/medTale.txt'
+    LZSS.compress(src_fp, com_fp)
+    LZSS.expand(com_fp, exp_fp)
@@ -1,4 +1,9 @@
-from bitio import BitReader, BitWriter
+import io
+import threading
+from array import array
+from bitio import BUFFER_SIZE, BitReader, BitWriter, iter_chunks, open_input, split_chunks
+from checksum import ChecksumReader, TrailerReader, reject_trailer, verify
+from stats import NULL_STATS
 
 
 class TST:
@@ -6,6 +11,7 @@ class TST:
 
     class Node:
         """树的节点"""
+        __slots__ = ('c', 'val', 'left', 'mid', 'right')
 
         def __init__(self, c, val=None, left=None, mid=None, right=None):
             self.c = c
@@ -16,61 +22,47 @@ class TST:
         self.root = None
 
     def get(self, key):
-        """查找字符串key"""
+        """查找字符串key(迭代实现, 键的长度不受递归深度限制)"""
         if not key:
             raise Exception('key must non-empty string')
-        x = self._get(self.root, key, 0)
-        if x is None:
-            return None
-        return x.val
-
-    def _get(self, x, key, d):
-        """
-        递归查找
-        :param x: 当前节点
-        :param key: 字符串key
-        :param d: 当前下标(of key)
-        :return:
-        """
-        if x is None:
-            return None
-        c = key[d]
-        if c < x.c:
-            return self._get(x.left, key, d)
-        elif c > x.c:
-            return self._get(x.right, key, d)
-        elif d < len(key) - 1:
-            return self._get(x.mid, key, d+1)
-        else:
-            return x
+        x, d = self.root, 0
+        while x is not None:
+            c = key[d]
+            if c < x.c:
+                x = x.left
+            elif c > x.c:
+                x = x.right
+            elif d < len(key) - 1:
+                x, d = x.mid, d + 1
+            else:
+                return x.val
+        return None
 
     def put(self, key, val):
         """插入键值对 key(字符串): val"""
         if not key:
             raise Exception('key must non-empty string')
-        self.root = self._put(self.root, key, val, 0)
-
-    def _put(self, x, key, val, d):
-        """
-        插入键值对
-        :param x: 当前节点
-        :param key: 字符串key
-        :param val: 值
-        :param d: 当前下标(of key)
-        :return:
-        """
-        c = key[d]
-        if x is None:
-            x = TST.Node(c)
-        if c < x.c:
-            x.left = self._put(x.left, key, val, d)
-        elif c > x.c:
-            x.right = self._put(x.right, key, val, d)
-        elif d < len(key) - 1:
-            x.mid = self._put(x.mid, key, val, d+1)
-        else:
-            x.val = val
-        return x
+        if self.root is None:
+            self.root = TST.Node(key[0])
+        x, d = self.root, 0
+        while True:
+            c = key[d]
+            if c < x.c:
+                if x.left is None:
+                    x.left = TST.Node(c)
+                x = x.left
+            elif c > x.c:
+                if x.right is None:
+                    x.right = TST.Node(c)
+                x = x.right
+            elif d < len(key) - 1:
+                d += 1
+                if x.mid is None:
+                    x.mid = TST.Node(key[d])
+                x = x.mid
+            else:
+                x.val = val
+                return
 
     def longest_prefix_of(self, query):
         if not query:
@@ -91,6 +83,143 @@ class TST:
         return query[:length]
 
 
+class ArrayTST:
+    """
+    用并行数组实现的三向单词查找树: 第i个节点的字符、值、左/中/右子节点分别存于 chars[i], vals[i],
+    left[i], mid[i], right[i]; 下标0保留为空节点. 所有操作都是迭代的.
+    键可以是字符串(按字符的码值比较), 也可以是 bytes 等整数序列.
+    """
+
+    def __init__(self, items=None):
+        self.chars = array('I', [0])
+        self.left = array('I', [0])
+        self.mid = array('I', [0])
+        self.right = array('I', [0])
+        self.vals = [None]
+        self.root = 0
+        self.size = 0  # 键的个数
+        if items:
+            self.put_all(items)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    @staticmethod
+    def _codes(key):
+        """把键转换成整数序列"""
+        return [ord(c) for c in key] if isinstance(key, str) else key
+
+    def _new_node(self, c):
+        self.chars.append(c)
+        self.left.append(0)
+        self.mid.append(0)
+        self.right.append(0)
+        self.vals.append(None)
+        return len(self.vals) - 1
+
+    def get(self, key):
+        """查找键key, 不存在时返回None"""
+        if not key:
+            raise Exception('key must non-empty string')
+        key = self._codes(key)
+        chars, left, mid, right = self.chars, self.left, self.mid, self.right
+        x, d, last = self.root, 0, len(key) - 1
+        while x:
+            c = key[d]
+            if c < chars[x]:
+                x = left[x]
+            elif c > chars[x]:
+                x = right[x]
+            elif d < last:
+                x, d = mid[x], d + 1
+            else:
+                return self.vals[x]
+        return None
+
+    def put(self, key, val):
+        """插入键值对 key: val"""
+        if not key:
+            raise Exception('key must non-empty string')
+        key = self._codes(key)
+        chars, left, mid, right = self.chars, self.left, self.mid, self.right
+        if not self.root:
+            self.root = self._new_node(key[0])
+        x, d, last = self.root, 0, len(key) - 1
+        while True:
+            c = key[d]
+            if c < chars[x]:
+                if not left[x]:
+                    left[x] = self._new_node(c)
+                x = left[x]
+            elif c > chars[x]:
+                if not right[x]:
+                    right[x] = self._new_node(c)
+                x = right[x]
+            elif d < last:
+                d += 1
+                if not mid[x]:
+                    mid[x] = self._new_node(key[d])
+                x = mid[x]
+            else:
+                if self.vals[x] is None:
+                    self.size += 1
+                self.vals[x] = val
+                return
+
+    def put_all(self, items):
+        """
+        批量插入键值对: 先按键排序, 再按"中位数优先"的顺序插入, 使左右子树平衡.
+        (按顺序逐个插入256个单字符键会退化成一条长链)
+        :param items: (键, 值)的可迭代对象, 或 dict
+        :return:
+        """
+        if isinstance(items, dict):
+            items = items.items()
+        items = sorted(items, key=lambda kv: self._codes(kv[0]))
+        stack = [(0, len(items))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            m = (lo + hi) // 2
+            self.put(*items[m])
+            stack.append((m + 1, hi))
+            stack.append((lo, m))
+
+    def prefix_match(self, buf, offset=0):
+        """
+        在 buf[offset:] 上查找最长的、作为键存在的前缀, 不切片复制 buf
+        :param buf: 字符串或 bytes/bytearray/memoryview
+        :param offset: 起始下标
+        :return: (匹配长度, 对应的值); 没有匹配时为 (0, None)
+        """
+        chars, left, mid, right, vals = self.chars, self.left, self.mid, self.right, self.vals
+        text = isinstance(buf, str)
+        x, i, n = self.root, offset, len(buf)
+        length, val = 0, None
+        while x and i < n:
+            c = ord(buf[i]) if text else buf[i]
+            if c < chars[x]:
+                x = left[x]
+            elif c > chars[x]:
+                x = right[x]
+            else:
+                i += 1
+                if vals[x] is not None:
+                    length, val = i - offset, vals[x]
+                x = mid[x]
+        return length, val
+
+    def longest_prefix_of(self, query):
+        """与 TST.longest_prefix_of 相同, 返回 query 中作为键存在的最长前缀"""
+        if not query:
+            return None
+        return query[:self.prefix_match(query)[0]]
+
+
 class LZW:
     """
     LZW压缩, ...
@@ -99,82 +228,504 @@ class LZW:
     code_bit_len = 12   # 编码bit位数
     char_set_len = pow(2, char_bit_len)  # 字符集大小, 字符总数
     code_set_len = pow(2, code_bit_len)  # 编码集大小, 编码总数
+    chunk_size = 1 << 16  # 每次读入的字节数
+    modes = ('fixed', 'variable')  # 定长12位编码 / 变长编码(9位起逐步加宽, 可清空符号表)
+    min_code_bit_len = 9  # 变长模式的起始编码位数
+    max_code_bit_len = 16  # 变长模式默认的最大编码位数
+    clear_code = char_set_len + 1  # 变长模式中清空符号表的编码
+    check_gap = 1 << 13  # 变长模式符号表满后, 每读入这么多字节检查一次压缩率
+    entry_cache_len = 64  # 解码时, 不长于此的符号表条目缓存展开后的字节
+
+    class Compressor(object):
+        """
+        可重复使用的压缩上下文, 用于逐条压缩大量小消息: 参数检查, 预训练字典的加载和种子符号表的构建只在创建时做一次,
+        每条消息从种子符号表的副本开始. 创建后不再修改, 可以在多个线程中共用
+        """
+        def __init__(self, mode='fixed', max_code_bit_len=None, checksum=False, dictionary=None):
+            """
+            :param mode: 见 LZW.compress
+            :param max_code_bit_len: 见 LZW.compress, None表示 LZW.max_code_bit_len
+            :param checksum: 见 LZW.compress
+            :param dictionary: 见 LZW.compress
+            """
+            self.mode = mode
+            self.max_code_bit_len = max_code_bit_len or LZW.max_code_bit_len
+            self.checksum = checksum
+            self.seed = LZW._seed(dictionary)
+            LZW._check(mode, self.max_code_bit_len, self.seed)
+            self.seed_st = LZW._seed_table(self.seed)
+
+        def compress(self, data, stats=None):
+            """压缩一条消息, 结果与相同参数的 LZW.compress_bytes 相同"""
+            dst = io.BytesIO()
+            LZW._compress_stream(io.BytesIO(data), dst, self.mode, self.max_code_bit_len, self.checksum, stats,
+                                 self.seed, self.seed_st)
+            return dst.getvalue()
+
+    class Decompressor(object):
+        """
+        可重复使用的解压上下文: 解码用的符号表数组(见 LZW._decode_tables)每个线程只构建一次,
+        之后的消息直接覆盖使用, 不再分配和初始化. 可以在多个线程中共用
+        """
+        def __init__(self, mode='fixed', checksum=False, dictionary=None):
+            """
+            :param mode: 见 LZW.expand
+            :param checksum: 见 LZW.expand
+            :param dictionary: 见 LZW.expand
+            """
+            if mode not in LZW.modes:
+                raise ValueError('unknown LZW mode: %r' % mode)
+            self.mode = mode
+            self.checksum = checksum
+            self.seed = LZW._seed(dictionary)
+            self.local = threading.local()  # 每个线程各自的符号表数组
+
+        def expand(self, data, stats=None):
+            """解压一条消息, 返回解压后的字节"""
+            tables = getattr(self.local, 'tables', None)
+            if tables is None:
+                tables = self.local.tables = {}
+            st = NULL_STATS if stats is None else stats
+            src = st.reader(io.BytesIO(data))
+            if self.checksum:
+                src = TrailerReader(src)
+            chunks = LZW._decode(st.bit_reader(BitReader(src)), self.mode == 'variable', st, self.seed, None, tables)
+            if self.checksum:
+                chunks = verify(chunks, src)
+            with st.stage('decode'):
+                return b''.join(chunks)
 
     @staticmethod
-    def compress(origin_filepath, compress_filepath):
+    def compress(origin_filepath, compress_filepath, mode='fixed', max_code_bit_len=max_code_bit_len, checksum=False,
+                 stats=None, dictionary=None):
         """
         将``原始文件``压缩到``压缩文件``中
         :param origin_filepath: 原始文件
         :param compress_filepath: 压缩文件
-        :return: 没有返回值
+        :param mode: 'fixed' 定长12位编码; 'variable' 变长编码
+        :param max_code_bit_len: 变长模式的最大编码位数(9~24)
+        :param checksum: 是否在压缩数据后追加原始数据的CRC32和长度, 解压时校验(压缩和解压需一致)
+        :param stats: Stats 对象, 记录各阶段耗时和计数(见 stats.py); None表示不统计
+        :param dictionary: 预训练字典(dictionary.Dictionary 或其ID), 用其中的种子条目初始化符号表;
+                           压缩数据中不记录字典, 解压时需传入同一个字典
+        :return: stats
         """
-        st = TST()
-        for i in range(LZW.char_set_len):
-            st.put(chr(i), i)
+        with open_input(origin_filepath) as ori_f, open(compress_filepath, 'wb') as com_f:
+            return LZW.compress_stream(ori_f, com_f, mode, max_code_bit_len, checksum, stats, dictionary)
+
+    @staticmethod
+    def compress_bytes(data, mode='fixed', max_code_bit_len=max_code_bit_len, checksum=False, stats=None,
+                       dictionary=None):
+        """压缩内存中的字节, 返回压缩后的字节"""
+        dst = io.BytesIO()
+        LZW.compress_stream(io.BytesIO(data), dst, mode, max_code_bit_len, checksum, stats, dictionary)
+        return dst.getvalue()
+
+    @staticmethod
+    def compress_stream(src, dst, mode='fixed', max_code_bit_len=max_code_bit_len, checksum=False, stats=None,
+                        dictionary=None):
+        """
+        从二进制文件对象 src 按段读取, 压缩后写入二进制文件对象 dst, 内存占用只与符号表大小有关
+        :param src: 可读的二进制文件对象
+        :param dst: 可写的二进制文件对象
+        :param mode: 见 compress
+        :param max_code_bit_len: 见 compress
+        :param checksum: 见 compress
+        :param stats: 见 compress
+        :param dictionary: 见 compress
+        :return: stats
+        """
+        seed = LZW._seed(dictionary)
+        LZW._check(mode, max_code_bit_len, seed)
+        LZW._compress_stream(src, dst, mode, max_code_bit_len, checksum, stats, seed)
+        return stats
+
+    @staticmethod
+    def _check(mode, max_code_bit_len, seed):
+        """检查压缩参数, 不合法时抛出 ValueError"""
+        if mode not in LZW.modes:
+            raise ValueError('unknown LZW mode: %r' % mode)
+        if not LZW.min_code_bit_len <= max_code_bit_len <= 24:
+            raise ValueError('max_code_bit_len must be in [%d, 24]' % LZW.min_code_bit_len)
+        max_code = LZW.code_set_len if mode == 'fixed' else 1 << max_code_bit_len
+        if LZW.clear_code + 1 + len(seed) >= max_code:
+            raise ValueError('dictionary has %d LZW entries, too many for %d codes' % (len(seed), max_code))
+
+    @staticmethod
+    def _compress_stream(src, dst, mode, max_code_bit_len, checksum, stats, seed, seed_st=None):
+        """compress_stream 的实现, 参数已检查; seed_st 是预先构建的种子符号表(见 _seed_table), None表示现场构建"""
+        st = NULL_STATS if stats is None else stats
+        src, dst = st.reader(src), st.writer(dst)
+        if checksum:
+            src = ChecksumReader(src)
+        with st.bit_writer(BitWriter(dst)) as writer, st.stage('encode'):
+            chunks = iter_chunks(src, LZW.chunk_size)
+            if mode == 'variable':
+                LZW._encode_variable(chunks, writer, max_code_bit_len, st, seed, seed_st)
+            else:
+                LZW._encode(chunks, writer, st, seed, seed_st)
+        if checksum:
+            dst.write(src.trailer())
+
+    @staticmethod
+    def _seed(dictionary):
+        """
+        取出预训练字典中的LZW种子条目
+        :param dictionary: dictionary.Dictionary 或其ID, None表示不用字典
+        :return: [(前缀编码, 字节)], 第i个条目的编码是 clear_code + 1 + i; 没有字典时为空
+        """
+        if dictionary is None:
+            return ()
+        from dictionary import get  # dictionary 模块依赖 Huffman, 用到时才导入
+        return get(dictionary).seed
+
+    @staticmethod
+    def _seed_table(seed):
+        """种子条目 -> 编码端的符号表 {(前缀编码 << 8) | 字节: 编码}"""
+        return {(p << 8) | ch: LZW.clear_code + 1 + i for i, (p, ch) in enumerate(seed)}
+
+    @staticmethod
+    def _encode(chunks, writer, stats=NULL_STATS, seed=(), seed_st=None):
+        """
+        流式LZW编码: 符号表以(前缀编码, 下一个字节)为键, 每个输入字节只查一次表,
+        不复制剩余输入, 内存只与符号表大小有关
+        :param chunks: 依次产出输入字节段的可迭代对象
+        :param writer: 写入组件
+        :param stats: Stats 对象
+        :param seed: 预训练字典的种子条目, 见 _seed
+        :param seed_st: 预先构建的种子符号表, 见 _seed_table; 不会被修改
+        :return:
+        """
+        # (前缀编码 << 8 | 字节) -> 编码; 单个字符的编码就是它本身, 不必存储
+        st = LZW._seed_table(seed) if seed_st is None else dict(seed_st)
         code = LZW.char_set_len + 1  # 留出char_set_len这个数字为EOF编码
+        if seed:  # 种子条目从 clear_code + 1 开始编号
+            code = LZW.clear_code + 1 + len(seed)
+        code_bit_len, code_set_len = LZW.code_bit_len, LZW.code_set_len
+        write_bits = writer.write_bits
+        prefix = -1  # 当前最长前缀的编码, -1表示还没有读入字符
+        for chunk in chunks:
+            for ch in chunk:
+                if prefix < 0:
+                    prefix = ch
+                    continue
+                key = (prefix << 8) | ch
+                nxt = st.get(key)
+                if nxt is not None:  # 前缀+ch仍在符号表中, 继续向前匹配
+                    prefix = nxt
+                    continue
+                write_bits(prefix, code_bit_len)  # 将最长前缀的编码写入压缩文件
+                if code < code_set_len:
+                    # 将此(最长前缀+前瞻字符)构成的新子串和下一编码关联并加入符号表
+                    st[key] = code
+                    code += 1
+                prefix = ch
+        if prefix >= 0:
+            write_bits(prefix, code_bit_len)
+        write_bits(LZW.char_set_len, code_bit_len)  # EOF的编码
+        if code >= code_set_len:
+            stats.add('dict_fills')
 
-        ori_f = open(origin_filepath, 'rb')
-        com_f = open(compress_filepath, 'wb')
-
-        with BitReader(ori_f) as reader:
-            with BitWriter(com_f) as writer:
-                # 把8位的一个字节看作一个字符作为输入(可以处理任意文件)
-                input_string = []
-                while True:
-                    ch = reader.read_bits(LZW.char_bit_len)
-                    if not reader.read:
-                        break
-                    input_string.append(chr(ch))
-                input_string = ''.join(input_string)
-
-                while len(input_string) > 0:
-                    s = st.longest_prefix_of(input_string)  # 最长前缀
-                    writer.write_bits(st.get(s), LZW.code_bit_len)  # 将s的编码写入压缩文件
-                    if len(s) < len(input_string) and code < LZW.code_set_len:
-                        # 将此(最长前缀+前瞻字符)构成的新子串和下一编码关联并加入符号表
-                        st.put(input_string[:len(s)+1], code)
+    @staticmethod
+    def _encode_variable(chunks, writer, max_code_bit_len, stats=NULL_STATS, seed=(), seed_st=None):
+        """
+        变长LZW编码(类似Unix compress): 编码位数从9位开始, 编码值用完时加宽一位, 直到 max_code_bit_len;
+        符号表满后定期检查压缩率, 压缩率下降时写入清空编码, 清空符号表重新开始.
+        文件头为一个字节, 记录 max_code_bit_len
+        :param chunks: 依次产出输入字节段的可迭代对象
+        :param writer: 写入组件
+        :param max_code_bit_len: 最大编码位数
+        :param stats: Stats 对象
+        :param seed: 预训练字典的种子条目, 见 _seed; 清空符号表时回到只有种子条目的状态
+        :param seed_st: 见 _encode
+        :return:
+        """
+        writer.write_bits(max_code_bit_len, LZW.char_bit_len)
+        first_code = LZW.clear_code + 1 + len(seed)  # 留出EOF和清空符号表两个编码
+        start_width = max(LZW.min_code_bit_len, (first_code - 1).bit_length())
+        max_code = 1 << max_code_bit_len
+        write_bits = writer.write_bits
+        if seed_st is None:
+            seed_st = LZW._seed_table(seed)
+        st = dict(seed_st)
+        code = first_code
+        width = start_width
+        prefix = -1
+        in_bytes, out_bits = 0, 0  # 本轮读入的字节数和写出的比特数
+        ratio = 0.0  # 上次检查时的压缩率
+        clear = False  # 压缩率下降, 在下一次输出编码后清空符号表
+        gap = LZW.check_gap
+        pending = gap  # 距离下一次检查还需读入的字节数(检查点与输入的分段方式无关)
+        for chunk in chunks:
+            start = 0
+            while start < len(chunk):
+                piece = chunk[start:start + pending]
+                start += len(piece)
+                for ch in piece:
+                    if prefix < 0:
+                        prefix = ch
+                        continue
+                    key = (prefix << 8) | ch
+                    nxt = st.get(key)
+                    if nxt is not None:
+                        prefix = nxt
+                        continue
+                    write_bits(prefix, width)
+                    out_bits += width
+                    if clear:  # 只有符号表满了才会清空
+                        stats.add('dict_fills')
+                        stats.add('dict_resets')
+                        write_bits(LZW.clear_code, width)
+                        st = dict(seed_st)
+                        code = first_code
+                        width = start_width
+                        clear = False
+                    elif code < max_code:
+                        st[key] = code
                         code += 1
-                    input_string = input_string[len(s):]  # 输入中s完成读取
-                writer.write_bits(LZW.char_set_len, LZW.code_bit_len)  # EOF的编码
-        ori_f.close()
-        com_f.close()
+                        if code > 1 << width and width < max_code_bit_len:  # 编码值用完, 加宽一位
+                            width += 1
+                    prefix = ch
+                in_bytes += len(piece)
+                pending -= len(piece)
+                if pending:
+                    continue
+                pending = gap
+                if code >= max_code and out_bits and not clear:
+                    new_ratio = in_bytes / out_bits
+                    if new_ratio < ratio:  # 从这个检查点开始新的一轮
+                        clear = True
+                        in_bytes, out_bits, ratio = 0, 0, 0.0
+                    else:
+                        ratio = new_ratio
+        if prefix >= 0:
+            write_bits(prefix, width)
+            # 解码端读到最后一个编码后会按"又加入了一个条目"来判断是否加宽, 这里保持一致
+            if code < max_code and code + 1 > 1 << width and width < max_code_bit_len:
+                width += 1
+        write_bits(LZW.char_set_len, width)  # EOF的编码
+        if code >= max_code:
+            stats.add('dict_fills')
 
     @staticmethod
-    def expand(compress_filepath, origin_filepath):
+    def expand(compress_filepath, origin_filepath, mode='fixed', checksum=False, stats=None, dictionary=None):
         """
         将``压缩文件``, 解压写到``原始文件``中
         :param compress_filepath: 压缩文件
         :param origin_filepath: 原始文件
-        :return: 不返回任何值
-        """
-        st = []
-        for i in range(LZW.char_set_len):  # 用字符初始化编译表
-            st.append(chr(i))
-        st.append('')  # (并未使用), 看作EOF的前瞻字符
-
-        com_f = open(compress_filepath, 'rb')
-        ori_f = open(origin_filepath, 'wb')
-
-        with BitReader(com_f) as reader:
-            with BitWriter(ori_f) as writer:
-                codeword = reader.read_bits(LZW.code_bit_len)
-                if codeword != LZW.char_set_len:  # 文件结尾
-                    val = st[codeword]
-                    while True:
-                        for ch in val:  # 子字符串写入
-                            writer.write_bits(ord(ch), LZW.char_bit_len)
-                        codeword = reader.read_bits(LZW.code_bit_len)
-                        if codeword == LZW.char_set_len:
-                            break
-                        if len(st) == codeword:  # 需要读取的编码正是要补全符号表的条目
-                            s = val + val[0]     # 这种情况下,前瞻字符必然是当前字符串首字母(好好思考下, ABABABA)
-                        else:
-                            s = st[codeword]  # 获取当前编码关联的字符串
-                        if len(st) < LZW.code_set_len:
-                            st.append(val + s[0])
-                        val = s
-        com_f.close()
-        ori_f.close()
+        :param mode: 压缩时使用的模式, 见 compress
+        :param checksum: 压缩时是否写入了校验尾部; 为True时校验失败抛出 ValueError
+        :param stats: 见 compress
+        :param dictionary: 压缩时使用的预训练字典, 见 compress
+        :return: stats
+        """
+        with open_input(compress_filepath) as com_f, open(origin_filepath, 'wb') as ori_f:
+            return LZW.expand_stream(com_f, ori_f, mode, checksum, stats, dictionary)
+
+    @staticmethod
+    def expand_bytes(data, mode='fixed', checksum=False, stats=None, dictionary=None):
+        """解压内存中的字节, 返回解压后的字节"""
+        dst = io.BytesIO()
+        LZW.expand_stream(io.BytesIO(data), dst, mode, checksum, stats, dictionary)
+        return dst.getvalue()
+
+    @staticmethod
+    def expand_stream(src, dst, mode='fixed', checksum=False, stats=None, dictionary=None):
+        """
+        从二进制文件对象 src 读取压缩数据, 解压后按段写入二进制文件对象 dst
+        :param src: 可读的二进制文件对象
+        :param dst: 可写的二进制文件对象
+        :param mode: 压缩时使用的模式, 见 compress
+        :param checksum: 见 expand
+        :param stats: 见 compress
+        :param dictionary: 见 expand
+        :return: stats
+        """
+        st = NULL_STATS if stats is None else stats
+        src, dst = st.reader(src), st.writer(dst)
+        if checksum:
+            src = TrailerReader(src)
+        chunks = LZW._expand_iter(src, mode, st, dictionary)
+        if checksum:
+            chunks = verify(chunks, src)
+        with st.stage('decode'):
+            for data in chunks:
+                dst.write(data)
+        return stats
+
+    @staticmethod
+    def iter_expand(src, chunk_size=BUFFER_SIZE, mode='fixed', checksum=False, stats=None, dictionary=None):
+        """
+        惰性解压, 生成器, 每次产出不超过 chunk_size 的一段解压后的字节.
+        只在使用方取下一段时才继续读取和解码压缩数据, 使用方停止迭代(或调用 close)后不再读取输入,
+        适合预览文件开头, 或扫描到某个标记为止; 输入是文件路径时, 生成器结束或关闭时关闭文件.
+        :param src: 压缩文件路径, 或可读的二进制文件对象
+        :param chunk_size: 每段的最大字节数, 也决定了每次解码多少数据
+        :param mode: 压缩时使用的模式, 见 compress
+        :param checksum: 见 expand; 只有迭代到结尾时才会校验
+        :param stats: 见 compress, 随迭代累计
+        :param dictionary: 见 expand
+        :return:
+        """
+        if not hasattr(src, 'read'):
+            with open_input(src) as f:
+                yield from LZW.iter_expand(f, chunk_size, mode, checksum, stats, dictionary)
+            return
+        st = NULL_STATS if stats is None else stats
+        src = st.reader(src)
+        if checksum:
+            src = TrailerReader(src)
+        chunks = LZW._expand_iter(src, mode, st, dictionary, chunk_size)
+        if checksum:
+            chunks = verify(chunks, src)
+        yield from split_chunks(chunks, chunk_size)
+
+    @staticmethod
+    def _expand_iter(src, mode, stats=NULL_STATS, dictionary=None, chunk_size=None):
+        """解压 src, 生成器, 每次产出一段(大约 chunk_size 字节, None表示 LZW.chunk_size)解压后的字节"""
+        if mode not in LZW.modes:
+            raise ValueError('unknown LZW mode: %r' % mode)
+        return LZW._decode(stats.bit_reader(BitReader(src)), mode == 'variable', stats, LZW._seed(dictionary),
+                           chunk_size)
+
+    @staticmethod
+    def _decode(reader, variable=False, stats=NULL_STATS, seed=(), chunk_size=None, tables=None):
+        """
+        LZW解码, 生成器, 每次产出一段解码后的字节.
+        符号表是几个并行的紧凑数组: 每个编码的前缀编码(prefix), 最后一个字节(suffix), 第一个字节(first), 长度(length);
+        另外为不长于 entry_cache_len 的条目, 以及长度是 entry_cache_len 整数倍的条目缓存展开后的 bytes,
+        其余条目沿前缀链回溯(不超过 entry_cache_len 步)到最近的已缓存条目再拼接.
+        这样内存只与符号表大小有关, 又避免了逐字节复制.
+        :param reader: 读取组件
+        :param variable: 是否为变长模式(见 _encode_variable)
+        :param stats: Stats 对象
+        :param seed: 预训练字典的种子条目, 见 _seed
+        :param chunk_size: 每段产出的字节数(大约), None表示 LZW.chunk_size
+        :param tables: 可重复使用的符号表数组 {最大编码位数: _decode_tables 的结果}, 缺少的会加入其中;
+                       None表示每次新建
+        :return:
+        """
+        if variable:
+            max_code_bit_len = reader.read_bits(LZW.char_bit_len)
+            if not LZW.min_code_bit_len <= max_code_bit_len <= 24:
+                raise ValueError('corrupt LZW header')
+            first_code = LZW.clear_code + 1 + len(seed)
+            start_width = max(LZW.min_code_bit_len, (first_code - 1).bit_length())
+            clear_code = LZW.clear_code
+        else:
+            max_code_bit_len = start_width = LZW.code_bit_len
+            first_code = LZW.clear_code + 1 + len(seed) if seed else LZW.char_set_len + 1
+            clear_code = LZW.clear_code if seed else -1  # 定长模式没有清空编码; 有种子条目时这个编码空着, 出现即是损坏
+        if first_code >= 1 << max_code_bit_len:
+            raise ValueError('dictionary has %d LZW entries, too many for %d-bit codes' % (len(seed), max_code_bit_len))
+        eof = LZW.char_set_len
+        max_code = 1 << max_code_bit_len
+        arrays = None if tables is None else tables.get(max_code_bit_len)
+        if arrays is None:
+            arrays = LZW._decode_tables(max_code_bit_len, seed)
+            if tables is not None:
+                tables[max_code_bit_len] = arrays
+        prefix, suffix, first, length, entries = arrays
+        cache_len = LZW.entry_cache_len
+        chunk_size = chunk_size or LZW.chunk_size
+        read_bits = reader.read_bits
+        out = bytearray()
+        while True:  # 每次循环处理一轮(两次清空符号表之间)
+            n = first_code  # 下一个要加入符号表的编码
+            width = start_width
+            prev = read_bits(width)
+            if prev == eof or not reader.read:
+                break
+            if prev == clear_code and variable:
+                continue
+            if prev >= first_code or prev == clear_code:  # 每一轮的第一个编码必须是单个字节或种子条目
+                raise ValueError('corrupt LZW stream')
+            out += entries[prev]
+            while True:
+                # 编码端在写出上一个编码后加入了一个条目, 据此判断是否需要加宽
+                if n + 1 > 1 << width and width < max_code_bit_len:
+                    width += 1
+                codeword = read_bits(width)
+                if codeword == eof or not reader.read:
+                    if n >= max_code:
+                        stats.add('dict_fills')
+                    if out:
+                        yield bytes(out)
+                    reject_trailer(reader)
+                    return
+                if codeword == clear_code:
+                    if not variable:
+                        raise ValueError('corrupt LZW stream')
+                    stats.add('dict_fills')
+                    stats.add('dict_resets')
+                    break
+                if codeword > n:  # 只能引用已有的条目, 或正要加入的条目(ABABABA)
+                    raise ValueError('corrupt LZW stream')
+                if n < max_code:
+                    # 新条目 = 上一个字符串 + 当前字符串的首字母;
+                    # 若当前编码正是这个新条目(ABABABA), 其首字母就是上一个字符串的首字母
+                    ch = first[codeword] if codeword < n else first[prev]
+                    prefix[n] = prev
+                    suffix[n] = ch
+                    first[n] = first[prev]
+                    size = length[n] = length[prev] + 1
+                    if size <= cache_len or not size % cache_len:
+                        val = entries[prev]
+                        if val is None:
+                            val = LZW._expand_entry(prev, entries, prefix, suffix)
+                        entries[n] = val + bytes((ch,))
+                    else:
+                        entries[n] = None
+                    n += 1
+                val = entries[codeword]
+                if val is None:  # 长条目: 回溯到已缓存的前缀
+                    val = LZW._expand_entry(codeword, entries, prefix, suffix)
+                out += val
+                if len(out) >= chunk_size:
+                    yield bytes(out)
+                    out = bytearray()
+                prev = codeword
+        if out:
+            yield bytes(out)
+        reject_trailer(reader)
+
+    @staticmethod
+    def _decode_tables(max_code_bit_len, seed=()):
+        """
+        解码用的符号表数组(见 _decode): 单个字节和种子条目已经填好.
+        解码时 first_code 之后的编码总是先赋值再使用, 所以这些数组解码完一条消息后可以原样用于下一条
+        :param max_code_bit_len: 最大编码位数
+        :param seed: 预训练字典的种子条目, 见 _seed
+        :return: (prefix, suffix, first, length, entries)
+        """
+        max_code = 1 << max_code_bit_len
+        prefix = array('H' if max_code_bit_len <= 16 else 'I', bytes(4 * max_code))[:max_code]
+        suffix = array('B', bytes(max_code))
+        first = array('B', range(LZW.char_set_len)) + array('B', bytes(max_code - LZW.char_set_len))
+        length = array('I', [1]) * max_code
+        entries = [bytes([i]) for i in range(LZW.char_set_len)] + [None] * (max_code - LZW.char_set_len)
+        cache_len = LZW.entry_cache_len
+        for code, (p, ch) in enumerate(seed, LZW.clear_code + 1):  # 种子条目, 清空符号表时保留
+            prefix[code] = p
+            suffix[code] = ch
+            first[code] = first[p]
+            size = length[code] = length[p] + 1
+            if size <= cache_len or not size % cache_len:
+                val = entries[p]
+                if val is None:
+                    val = LZW._expand_entry(p, entries, prefix, suffix)
+                entries[code] = val + bytes((ch,))
+        return prefix, suffix, first, length, entries
+
+    @staticmethod
+    def _expand_entry(code, entries, prefix, suffix):
+        """沿前缀链回溯到最近的已缓存条目, 拼接出 code 对应的字节串"""
+        tail = []
+        while entries[code] is None:
+            tail.append(suffix[code])
+            code = prefix[code]
+        tail.reverse()
+        return entries[code] + bytes(tail)
 
 
 if __name__ == '__main__':
@@ -185,6 +736,8 @@ if __name__ == '__main__':
     for idx, w in enumerate(words):
         tst.put(w, idx)
     print(tst.longest_prefix_of('shell'))
+    atst = ArrayTST(zip(words, range(len(words))))
+    print(atst.longest_prefix_of('shell'), atst.prefix_match(string, 4))
 
     # LZW
     src_fp = 'data/ababLZW.txt'
@@ -1,4 +1,7 @@
-from bitio import BitReader, BitWriter
+import io
+from bitio import BUFFER_SIZE, BitWriter, iter_chunks, open_input, split_chunks
+from checksum import ChecksumReader, TrailerReader, verify
+from stats import NULL_STATS
 
 
 class RunLength:
@@ -7,63 +10,316 @@ class RunLength:
     """
     encoding_length = 8  # 游程长度的编码位数
     max_length = pow(2, encoding_length) - 1  # 游程的最大长度
+    chunk_size = 1 << 16  # 每次处理的字节数
+    modes = ('fixed', 'varint')  # 定长8位游程长度 / 变长(Elias gamma)游程长度
+    gamma_table_len = 1 << 12  # 预先生成gamma编码字符串的游程长度范围
 
     @staticmethod
-    def compress(origin_filepath, compress_filepath):
+    def compress(origin_filepath, compress_filepath, mode='fixed', checksum=False, stats=None):
         """
         将``原始文件``压缩到``压缩文件``中
         :param origin_filepath: 原始文件
         :param compress_filepath: 压缩文件
-        :return: 没有返回值
-        """
-        ori_f = open(origin_filepath, 'rb')
-        com_f = open(compress_filepath, 'wb')
-
-        with BitReader(ori_f) as reader:
-            with BitWriter(com_f) as writer:
-                cnt = 0
-                old = False
-                while True:
-                    b = True if reader.read_bit() else False
-                    if not reader.read:  # End-of-file?
-                        break
-                    if b is not old:
-                        writer.write_bits(cnt, RunLength.encoding_length)
-                        cnt = 0
-                        old = not old
-                    else:
-                        if cnt == RunLength.max_length:
-                            writer.write_bits(cnt, RunLength.encoding_length)
-                            cnt = 0  # 另一种比特长度为0, 然后可以接着继续之前的比特计数
-                            writer.write_bits(cnt, RunLength.encoding_length)
-                    cnt += 1
-                writer.write_bits(cnt, RunLength.encoding_length)
-
-        ori_f.close()
-        com_f.close()
+        :param mode: 'fixed' 每个游程长度用8位表示, 超过255的游程拆成 255,0,...;
+                     'varint' 第1位记录第一个游程的比特, 之后每个游程长度用Elias gamma编码
+        :param checksum: 是否在压缩数据后追加原始数据的CRC32和长度, 解压时校验(压缩和解压需一致)
+        :param stats: Stats 对象, 记录各阶段耗时和计数(见 stats.py); None表示不统计
+        :return: stats
+        """
+        with open_input(origin_filepath) as ori_f, open(compress_filepath, 'wb') as com_f:
+            return RunLength.compress_stream(ori_f, com_f, mode, checksum, stats)
+
+    @staticmethod
+    def compress_bytes(data, mode='fixed', checksum=False, stats=None):
+        """压缩内存中的字节, 返回压缩后的字节"""
+        dst = io.BytesIO()
+        RunLength.compress_stream(io.BytesIO(data), dst, mode, checksum, stats)
+        return dst.getvalue()
+
+    @staticmethod
+    def compress_stream(src, dst, mode='fixed', checksum=False, stats=None):
+        """
+        从二进制文件对象 src 按段读取, 压缩后写入二进制文件对象 dst
+        :param src: 可读的二进制文件对象
+        :param dst: 可写的二进制文件对象
+        :param mode: 见 compress
+        :param checksum: 见 compress
+        :param stats: 见 compress
+        :return: stats
+        """
+        if mode not in RunLength.modes:
+            raise ValueError('unknown RunLength mode: %r' % mode)
+        st = NULL_STATS if stats is None else stats
+        src, dst = st.reader(src), st.writer(dst)
+        if checksum:
+            src = ChecksumReader(src)
+        with st.bit_writer(BitWriter(dst)) as writer, st.stage('encode'):
+            runs = RunLength._runs(iter_chunks(src, RunLength.chunk_size), st)
+            if mode == 'varint':
+                RunLength._encode_varint(runs, writer)
+            else:
+                RunLength._encode_fixed(runs, writer)
+        if checksum:
+            dst.write(src.trailer())
+        return stats
+
+    @staticmethod
+    def _runs(chunks, stats=NULL_STATS):
+        """
+        按整段(而不是逐比特)找出游程边界: 把一段字节转成'0'/'1'字符串, 在0/1交界处切分.
+        生成器, 每次产出一组游程长度; 游程0/1交替出现, 总是从0的游程开始(长度可能为0)
+        :param chunks: 依次产出输入字节段的可迭代对象
+        :param stats: Stats 对象, 记录游程个数
+        :return:
+        """
+        bit, cnt = '0', 0  # 尚未结束的游程
+        for chunk in chunks:
+            if not chunk:
+                continue
+            s = format(int.from_bytes(chunk, 'big'), '0%db' % (len(chunk) * 8))
+            parts = s.replace('01', '0 1').replace('10', '1 0').split()
+            lengths = list(map(len, parts))
+            if parts[0][0] == bit:  # 与上一段末尾的游程相连
+                lengths[0] += cnt
+                runs = lengths[:-1]
+            else:
+                runs = [cnt] + lengths[:-1]
+            bit, cnt = parts[-1][0], lengths[-1]
+            if runs:
+                stats.add('runs', len(runs))
+                yield runs
+        stats.add('runs')
+        yield [cnt]
 
     @staticmethod
-    def expand(compress_filepath, origin_filepath):
+    def _encode_fixed(runs, writer):
+        """
+        8位定长游程长度(原有格式): 超过255的游程写成 255, 0, 255, 0, ..., 余数
+        :param runs: _runs 产出的游程长度
+        :param writer: 写入组件
+        :return:
+        """
+        max_length = RunLength.max_length
+        for lengths in runs:
+            if max(lengths) <= max_length:
+                writer.write_bytes(bytes(lengths))
+                continue
+            counts = bytearray()
+            for length in lengths:
+                if length > max_length:
+                    k = (length - 1) // max_length  # 另一种比特长度为0, 然后可以接着继续之前的比特计数
+                    counts += bytes((max_length, 0)) * k
+                    length -= max_length * k
+                counts.append(length)
+            writer.write_bytes(counts)
+
+    @staticmethod
+    def _gamma_table():
+        """游程长度 -> Elias gamma编码字符串"""
+        return [''] + ['0' * (n.bit_length() - 1) + format(n, 'b') for n in range(1, RunLength.gamma_table_len)]
+
+    @staticmethod
+    def _encode_varint(runs, writer):
+        """
+        变长游程长度: 第1位是第一个游程的比特, 之后每个游程长度(>=1)用Elias gamma编码,
+        长游程不再被拆成多个255
+        :param runs: _runs 产出的游程长度
+        :param writer: 写入组件
+        :return:
+        """
+        table = RunLength._gamma_table()
+        size = len(table)
+        first = True
+        for lengths in runs:
+            if first:
+                first = False
+                if lengths[0]:
+                    writer.write_bit(False)
+                else:  # 从1的游程开始
+                    writer.write_bit(True)
+                    lengths = lengths[1:]
+            s = ''.join([table[n] if n < size else '0' * (n.bit_length() - 1) + format(n, 'b')
+                         for n in lengths if n])
+            if s:
+                writer.write_bits(int(s, 2), len(s))
+
+    @staticmethod
+    def expand(compress_filepath, origin_filepath, mode='fixed', checksum=False, stats=None):
         """
         将``压缩文件``, 解压写到``原始文件``中
         :param compress_filepath: 压缩文件
         :param origin_filepath: 原始文件
-        :return: 不返回任何值
-        """
-        com_f = open(compress_filepath, 'rb')
-        ori_f = open(origin_filepath, 'wb')
-        with BitReader(com_f) as reader:
-            with BitWriter(ori_f) as writer:
-                b = False
-                while True:
-                    cnt = reader.read_bits(RunLength.encoding_length)
-                    if not reader.read:  # End-of-file?
-                        break
-                    for i in range(cnt):
-                        writer.write_bit(b)
-                    b = not b
-        com_f.close()
-        ori_f.close()
+        :param mode: 压缩时使用的模式, 见 compress
+        :param checksum: 压缩时是否写入了校验尾部; 为True时校验失败抛出 ValueError
+        :param stats: 见 compress
+        :return: stats
+        """
+        with open_input(compress_filepath) as com_f, open(origin_filepath, 'wb') as ori_f:
+            return RunLength.expand_stream(com_f, ori_f, mode, checksum, stats)
+
+    @staticmethod
+    def expand_bytes(data, mode='fixed', checksum=False, stats=None):
+        """解压内存中的字节, 返回解压后的字节"""
+        dst = io.BytesIO()
+        RunLength.expand_stream(io.BytesIO(data), dst, mode, checksum, stats)
+        return dst.getvalue()
+
+    @staticmethod
+    def expand_stream(src, dst, mode='fixed', checksum=False, stats=None):
+        """
+        从二进制文件对象 src 读取压缩数据, 解压后按段写入二进制文件对象 dst
+        :param src: 可读的二进制文件对象
+        :param dst: 可写的二进制文件对象
+        :param mode: 压缩时使用的模式, 见 compress
+        :param checksum: 见 expand
+        :param stats: 见 compress
+        :return: stats
+        """
+        st = NULL_STATS if stats is None else stats
+        src, dst = st.reader(src), st.writer(dst)
+        if checksum:
+            src = TrailerReader(src)
+        chunks = RunLength._expand_iter(src, mode, st)
+        if checksum:
+            chunks = verify(chunks, src)
+        with st.stage('decode'):
+            for data in chunks:
+                dst.write(data)
+        return stats
+
+    @staticmethod
+    def iter_expand(src, chunk_size=BUFFER_SIZE, mode='fixed', checksum=False, stats=None):
+        """
+        惰性解压, 生成器, 每次产出不超过 chunk_size 的一段解压后的字节.
+        只在使用方取下一段时才继续读取和解码压缩数据, 使用方停止迭代(或调用 close)后不再读取输入,
+        适合预览文件开头, 或扫描到某个标记为止; 输入是文件路径时, 生成器结束或关闭时关闭文件.
+        :param src: 压缩文件路径, 或可读的二进制文件对象
+        :param chunk_size: 每段的最大字节数, 也决定了每次解码多少数据
+        :param mode: 压缩时使用的模式, 见 compress
+        :param checksum: 见 expand; 只有迭代到结尾时才会校验
+        :param stats: 见 compress, 随迭代累计
+        :return:
+        """
+        if not hasattr(src, 'read'):
+            with open_input(src) as f:
+                yield from RunLength.iter_expand(f, chunk_size, mode, checksum, stats)
+            return
+        st = NULL_STATS if stats is None else stats
+        src = st.reader(src)
+        if checksum:
+            src = TrailerReader(src)
+        chunks = RunLength._expand_iter(src, mode, st, chunk_size)
+        if checksum:
+            chunks = verify(chunks, src)
+        yield from split_chunks(chunks, chunk_size)
+
+    @staticmethod
+    def _expand_iter(src, mode, stats=NULL_STATS, chunk_size=None):
+        """
+        解压 src, 生成器, 每次产出一段解压后的字节.
+        每次读入 chunk_size(None表示 RunLength.chunk_size)字节的压缩数据, 产出的一段是它们展开后的结果
+        """
+        if mode not in RunLength.modes:
+            raise ValueError('unknown RunLength mode: %r' % mode)
+        chunk_size = chunk_size or RunLength.chunk_size
+        chunks = iter_chunks(src, chunk_size)
+        if mode == 'varint':
+            return RunLength._bits(RunLength._decode_varint(chunks), stats, chunk_size)
+        return RunLength._bits(RunLength._decode_fixed(chunks), stats, chunk_size)
+
+    @staticmethod
+    def _decode_fixed(chunks):
+        """8位定长游程长度, 生成器, 每次产出(首个游程的比特, 游程长度)"""
+        bit = 0
+        for chunk in chunks:
+            yield bit, chunk
+            if len(chunk) & 1:
+                bit ^= 1
+
+    @staticmethod
+    def _decode_varint(chunks):
+        """Elias gamma编码的游程长度, 生成器, 每次产出(首个游程的比特, 游程长度)"""
+        s, i = '', 0  # 尚未解码的比特串, 及其中下一个未读位置
+        bit = None
+        for chunk in chunks:
+            s = s[i:] + format(int.from_bytes(chunk, 'big'), '0%db' % (len(chunk) * 8))
+            i = 0
+            if bit is None:
+                bit, i = int(s[0]), 1
+            lengths = []
+            n = len(s)
+            while True:
+                j = s.find('1', i)
+                if j < 0:
+                    break
+                end = 2 * j - i + 1
+                if end > n:  # 这个游程长度跨越了当前段
+                    break
+                lengths.append(int(s[j:end], 2))
+                i = end
+            yield bit, lengths
+            if len(lengths) & 1:
+                bit ^= 1
+
+    @staticmethod
+    def _bits(runs, stats=NULL_STATS, chunk_size=None):
+        """
+        由游程重建字节: 游程展开成'0'/'1'字符串后整段转换为字节, 生成器.
+        一组游程的总长度超过 chunk_size 字节时逐个游程处理: 补齐到字节边界后, 长游程中整字节的部分
+        直接重复 b'\\x00'/b'\\xff' 输出, 每次不超过 chunk_size 字节, 时间和内存与单个游程的长度无关
+        :param runs: 产出(首个游程的比特, 游程长度)的可迭代对象, 游程0/1交替
+        :param stats: Stats 对象, 记录游程个数
+        :param chunk_size: 每段产出的字节数(大约), None表示 RunLength.chunk_size
+        :return:
+        """
+        chunk_size = chunk_size or RunLength.chunk_size
+        limit = chunk_size * 8  # 比特串最多累积这么多位
+        zeros = ['0' * n for n in range(RunLength.max_length + 1)]
+        ones = ['1' * n for n in range(RunLength.max_length + 1)]
+        rest = ''  # 不足一字节的比特
+        for bit, lengths in runs:
+            if not lengths:
+                continue
+            stats.add('runs', len(lengths))
+            if max(lengths) < len(zeros):
+                first, second = (ones, zeros) if bit else (zeros, ones)
+                parts = [''] * len(lengths)
+                parts[0::2] = map(first.__getitem__, lengths[0::2])
+                parts[1::2] = map(second.__getitem__, lengths[1::2])
+            elif sum(lengths) + len(rest) < limit:
+                chars = '10' if bit else '01'
+                parts = [chars[k & 1] * n for k, n in enumerate(lengths)]
+            else:
+                parts, size = [rest], len(rest)  # 这里的 parts 包含了上一组剩下的比特
+                rest = ''
+                for k, n in enumerate(lengths):
+                    c = '1' if bit ^ (k & 1) else '0'
+                    if size + n < limit:
+                        parts.append(c * n)
+                        size += n
+                        continue
+                    head = min(-size & 7, n)  # 补齐到字节边界
+                    s = ''.join(parts) + c * head
+                    n -= head
+                    m = len(s) & ~7
+                    if m:
+                        yield int(s[:m], 2).to_bytes(m >> 3, 'big')
+                    s = s[m:]  # 游程还有剩余时 s 已经是空串
+                    full = n >> 3
+                    fill = b'\xff' if c == '1' else b'\x00'
+                    while full:
+                        step = min(full, chunk_size)
+                        yield fill * step
+                        full -= step
+                    parts = [s, c * (n & 7)]
+                    size = len(s) + (n & 7)
+            s = rest + ''.join(parts)
+            m = len(s) & ~7
+            rest = s[m:]
+            if m:
+                yield int(s[:m], 2).to_bytes(m >> 3, 'big')
+        if rest:  # 正常情况下不会出现, 与原实现一样补0
+            yield int(rest.ljust(8, '0'), 2).to_bytes(1, 'big')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,176 @@
+"""
+asyncio 流式压缩/解压: 输入是 asyncio.StreamReader 或产出 bytes 的异步可迭代对象, 输出按块增量产出.
+
+输出使用分块容器格式(见 container.py), 可以直接用 Container.expand 解压, 反之亦然.
+每块的压缩/解压在 executor 中执行(默认是事件循环的线程池, 传入 ProcessPoolExecutor 可以利用多核),
+同时在处理中的块不超过 max_pending 个; 生成器只在使用方取走上一段输出后才继续读取输入,
+所以慢的下游会一直反压到上游的连接, 内存占用只与 block_size * max_pending 有关.
+
+使用进程池时, 要么在打开连接之前创建并预热进程池, 要么使用 forkserver/spawn 方式启动工作进程:
+fork 出的工作进程会继承已打开的套接字, 服务端关闭连接后对方收不到EOF.
+
+    async def handle(reader, writer):
+        await aio.compress_stream(reader, writer, codec='lzw-variable')
+
+    async for chunk in aio.expand(reader):
+        ...
+"""
+import asyncio
+from collections import deque
+
+from container import AUTO, CODEC_IDS, CODECS, Container, _compress_block, _expand_block
+
+BLOCK_SIZE = 1 << 18  # 默认块大小, 比文件压缩小一些, 让第一段输出更早发出
+MAX_PENDING = 2  # 默认同时在 executor 中处理的块数
+
+
+class _Source(object):
+    """把 asyncio.StreamReader 或异步可迭代对象统一成按字节数读取的接口"""
+    def __init__(self, source):
+        if hasattr(source, 'read'):
+            self.reader = source
+            self.chunks = None
+        else:
+            self.reader = None
+            self.chunks = source.__aiter__()
+        self.pending = b''
+        self.eof = False
+
+    async def _more(self, size):
+        if self.eof:
+            return b''
+        if self.reader is not None:
+            chunk = await self.reader.read(size)
+        else:
+            try:
+                chunk = await self.chunks.__anext__()
+            except StopAsyncIteration:
+                chunk = b''
+        if not chunk:
+            self.eof = True
+        return bytes(chunk)
+
+    async def read(self, size):
+        """读取 size 个字节, 只有到达结尾时才会不足"""
+        buf = bytearray(self.pending)
+        while len(buf) < size:
+            chunk = await self._more(size - len(buf))
+            if not chunk:
+                break
+            buf += chunk
+        self.pending = bytes(buf[size:])
+        return bytes(buf[:size])
+
+
+async def compress(source, codec='huffman', block_size=BLOCK_SIZE, executor=None, max_pending=MAX_PENDING):
+    """
+    异步生成器, 依次产出压缩后的字节段: 先是容器文件头, 之后每块一段(块头 + 压缩数据)
+    :param source: asyncio.StreamReader, 或产出 bytes 的异步可迭代对象
+    :param codec: 算法名称, 见 container.CODECS; 'auto' 每块自动选择
+    :param block_size: 块大小(字节)
+    :param executor: 执行压缩的 concurrent.futures.Executor, None表示事件循环默认的线程池
+    :param max_pending: 同时在 executor 中处理的块数
+    :return:
+    """
+    if codec != AUTO and codec not in CODEC_IDS:
+        raise ValueError('unknown codec: %r' % codec)
+    if block_size <= 0:
+        raise ValueError('block_size must be positive')
+    if max_pending <= 0:
+        raise ValueError('max_pending must be positive')
+    loop = asyncio.get_running_loop()
+    requested = None if codec == AUTO else CODEC_IDS[codec]
+    src = _Source(source)
+    yield Container.header.pack(Container.magic, Container.version)
+    pending = deque()  # (原始长度, 压缩任务)
+    try:
+        while True:
+            block = await src.read(block_size)
+            if block:
+                pending.append((len(block), loop.run_in_executor(executor, _compress_block, requested, block)))
+            while pending and (len(pending) >= max_pending or not block):
+                raw_len, task = pending.popleft()
+                codec_id, payload = await task
+                yield Container.frame.pack(codec_id, raw_len, len(payload)) + payload
+            if not block:
+                return
+    finally:
+        for _, task in pending:  # 使用方提前停止时取消还没开始的块
+            task.cancel()
+
+
+async def expand(source, executor=None, max_pending=MAX_PENDING):
+    """
+    异步生成器, 依次产出解压后的字节段(每块一段)
+    :param source: asyncio.StreamReader, 或产出 bytes 的异步可迭代对象, 内容是容器格式的压缩数据
+    :param executor: 执行解压的 concurrent.futures.Executor, None表示事件循环默认的线程池
+    :param max_pending: 同时在 executor 中处理的块数
+    :return:
+    """
+    if max_pending <= 0:
+        raise ValueError('max_pending must be positive')
+    loop = asyncio.get_running_loop()
+    src = _Source(source)
+    head = await src.read(Container.header.size)
+    if len(head) < Container.header.size:
+        raise ValueError('not a container file: too short')
+    magic, version = Container.header.unpack(head)
+    if magic != Container.magic:
+        raise ValueError('not a container file: bad magic %r' % magic)
+    if version != Container.version:
+        raise ValueError('unsupported container version: %d' % version)
+    pending = deque()
+    try:
+        while True:
+            head = await src.read(Container.frame.size)
+            done = not head or head[0] == Container.index_id  # 输入结束, 或后面是索引
+            if not done:
+                if len(head) < Container.frame.size:
+                    raise ValueError('truncated frame header')
+                codec_id, raw_len, comp_len = Container.frame.unpack(head)
+                if codec_id not in CODECS:
+                    raise ValueError('unknown codec id: %d' % codec_id)
+                payload = await src.read(comp_len)
+                if len(payload) < comp_len:
+                    raise ValueError('truncated frame payload')
+                pending.append(loop.run_in_executor(executor, _expand_block, codec_id, payload))
+            while pending and (len(pending) >= max_pending or done):
+                yield await pending.popleft()
+            if done:
+                return
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def compress_stream(source, writer, codec='huffman', block_size=BLOCK_SIZE, executor=None,
+                          max_pending=MAX_PENDING):
+    """
+    压缩 source 并写入 writer, 每写一段等待 writer.drain(), 下游慢时不再读取输入
+    :param source: 见 compress
+    :param writer: asyncio.StreamWriter, 或有 write() 和异步 drain() 的对象
+    :param codec: 见 compress
+    :param block_size: 见 compress
+    :param executor: 见 compress
+    :param max_pending: 见 compress
+    :return: 写入的字节数
+    """
+    total = 0
+    async for chunk in compress(source, codec, block_size, executor, max_pending):
+        writer.write(chunk)
+        await writer.drain()
+        total += len(chunk)
+    return total
+
+
+async def expand_stream(source, writer, executor=None, max_pending=MAX_PENDING):
+    """
+    解压 source 并写入 writer, 见 compress_stream
+    :return: 写入的字节数
+    """
+    total = 0
+    async for chunk in expand(source, executor, max_pending):
+        writer.write(chunk)
+        await writer.drain()
+        total += len(chunk)
+    return total
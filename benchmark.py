@@ -0,0 +1,252 @@
+"""
+基准测试: 在合成语料上反复测量各压缩算法的吞吐量(MB/s)和峰值内存, 结果保存为JSON, 并可与基线比较找出性能退化
+
+    python3 benchmark.py run --codecs huffman lzw --corpus text random --sizes 64K 1M --output bench.json
+    python3 benchmark.py compare baseline.json bench.json --threshold 0.1
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from container import CODECS, CODEC_IDS
+
+
+CORPUS_KINDS = ('text', 'random', 'runs', 'bitmap', 'repetitive')
+SIZE_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+
+def parse_size(s):
+    """'64K', '1M', '200M' -> 字节数"""
+    s = s.strip().upper().rstrip('B')
+    unit = s[-1:] if s[-1:] in SIZE_UNITS else ''
+    return int(float(s[:len(s) - len(unit)]) * SIZE_UNITS[unit])
+
+
+def format_size(n):
+    """字节数 -> '64K', '1M' 之类的简写"""
+    for unit in ('G', 'M', 'K'):
+        if n >= SIZE_UNITS[unit] and n % SIZE_UNITS[unit] == 0:
+            return '%d%s' % (n // SIZE_UNITS[unit], unit)
+    return str(n)
+
+
+def generate(kind, size, seed=0):
+    """
+    生成合成语料
+    :param kind: 'text' 按Zipf分布选词的英文样文本; 'random' 均匀随机字节; 'runs' 很长的0/1比特游程;
+                 'bitmap' 1位黑白图像(随机矩形); 'repetitive' 重复出现的片段, 偶尔有改动
+    :param size: 字节数
+    :param seed: 随机数种子, 相同的参数总是生成相同的数据
+    :return: bytes
+    """
+    if kind not in CORPUS_KINDS:
+        raise ValueError('unknown corpus kind: %r' % kind)
+    rng = random.Random('%s-%d' % (kind, seed))
+    out = bytearray()
+    if kind == 'random':
+        out += rng.randbytes(size)
+    elif kind == 'text':
+        letters = 'etaoinshrdlcumwfgypbvkjxqz'
+        vocab = [''.join(rng.choices(letters, weights=range(26, 0, -1), k=rng.randint(1, 10)))
+                 for _ in range(5000)]
+        weights = [1 / (i + 1) for i in range(len(vocab))]
+        while len(out) < size:
+            words = rng.choices(vocab, weights=weights, k=4096)
+            for i in range(0, len(words), 12):  # 每12个词一个句子
+                sentence = ' '.join(words[i:i + 12])
+                out += (sentence[:1].upper() + sentence[1:] + '.\n').encode()
+    elif kind == 'runs':
+        byte = 0
+        while len(out) < size:
+            out += bytes((byte,)) * int(rng.expovariate(1 / 64) + 1)
+            byte ^= 0xFF
+    elif kind == 'bitmap':
+        width = 1024  # 每行1024像素, 128字节
+        while len(out) < size:
+            # 每1024行重新摆放一组矩形
+            rects = []
+            for _ in range(rng.randint(4, 32)):
+                x, y = rng.randrange(width), rng.randrange(width)
+                rects.append((x, min(x + rng.randint(8, 256), width), y, y + rng.randint(8, 256)))
+            for y in range(width):
+                row = 0
+                for x0, x1, y0, y1 in rects:
+                    if y0 <= y < y1:
+                        row |= ((1 << (x1 - x0)) - 1) << (width - x1)
+                out += row.to_bytes(width // 8, 'big')
+    else:
+        pieces = [rng.randbytes(rng.randint(16, 256)) for _ in range(64)]
+        while len(out) < size:
+            piece = bytearray(rng.choice(pieces))
+            if rng.random() < 0.1:
+                piece[rng.randrange(len(piece))] = rng.randrange(256)
+            out += piece
+    return bytes(out[:size])
+
+
+def _timed(func, data, repeat, warmup):
+    """先预热 warmup 次, 再计时 repeat 次, 返回(最后一次的结果, 每次的秒数)"""
+    for _ in range(warmup):
+        func(data)
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(data)
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def _peak_memory(func, data):
+    """用 tracemalloc 测量一次调用期间(新分配的)内存峰值, 单独运行, 不影响计时"""
+    tracemalloc.start()
+    try:
+        func(data)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench(codec, data, repeat=5, warmup=1, memory=True):
+    """
+    测量一个算法在一段数据上的压缩率, 吞吐量和峰值内存
+    :param codec: 算法名称, 见 container.CODECS
+    :param data: 原始数据
+    :param repeat: 计时次数, 吞吐量按最快的一次计算
+    :param warmup: 预热次数
+    :param memory: 是否测量峰值内存(tracemalloc 会明显拖慢运行, 单独再跑一次)
+    :return: dict
+    """
+    if codec not in CODEC_IDS:
+        raise ValueError('unknown codec: %r' % codec)
+    _, alg, mode = CODECS[CODEC_IDS[codec]]
+    compressed, compress_times = _timed(lambda d: alg.compress_bytes(d, mode), data, repeat, warmup)
+    expanded, expand_times = _timed(lambda d: alg.expand_bytes(d, mode), compressed, repeat, warmup)
+    if expanded != data:
+        raise AssertionError('%s: expanded data differs from the original' % codec)
+    mb = len(data) / (1 << 20)
+    result = {
+        'codec': codec,
+        'size': len(data),
+        'compressed': len(compressed),
+        'ratio': len(compressed) / len(data) if data else 0.0,
+        'compress_times': compress_times,
+        'expand_times': expand_times,
+        'compress_mb_s': mb / min(compress_times) if min(compress_times) else 0.0,
+        'expand_mb_s': mb / min(expand_times) if min(expand_times) else 0.0,
+    }
+    if memory:
+        result['compress_peak'] = _peak_memory(lambda d: alg.compress_bytes(d, mode), data)
+        result['expand_peak'] = _peak_memory(lambda d: alg.expand_bytes(d, mode), compressed)
+    return result
+
+
+def run(codecs, kinds, sizes, repeat=5, warmup=1, memory=True, seed=0, log=sys.stderr):
+    """
+    在每种语料, 每个大小上测量每个算法
+    :return: 可以直接保存为JSON的dict
+    """
+    results = []
+    for kind in kinds:
+        for size in sizes:
+            data = generate(kind, size, seed)
+            for codec in codecs:
+                result = bench(codec, data, repeat, warmup, memory)
+                result['corpus'] = kind
+                results.append(result)
+                if log is not None:
+                    print('%-18s %-10s %6s  ratio %.3f  compress %8.2f MB/s  expand %8.2f MB/s' % (
+                        codec, kind, format_size(size), result['ratio'],
+                        result['compress_mb_s'], result['expand_mb_s']), file=log)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeat': repeat,
+            'warmup': warmup,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    与基线比较, 找出退化: 吞吐量下降, 峰值内存增加或压缩率变差超过 threshold(比例)
+    :param baseline: run 的结果(基线)
+    :param current: run 的结果
+    :param threshold: 允许的波动比例
+    :return: [(算法, 语料, 大小, 指标, 基线值, 当前值)]
+    """
+    def key(r):
+        return r['codec'], r['corpus'], r['size']
+    base = {key(r): r for r in baseline['results']}
+    regressions = []
+    for r in current['results']:
+        b = base.get(key(r))
+        if b is None:
+            continue
+        for metric in ('compress_mb_s', 'expand_mb_s'):  # 越大越好
+            if b[metric] and r[metric] < b[metric] * (1 - threshold):
+                regressions.append(key(r) + (metric, b[metric], r[metric]))
+        for metric in ('compress_peak', 'expand_peak', 'ratio'):  # 越小越好
+            if metric in b and metric in r and r[metric] > b[metric] * (1 + threshold):
+                regressions.append(key(r) + (metric, b[metric], r[metric]))
+    return regressions
+
+
+def _print_regressions(regressions):
+    for codec, kind, size, metric, old, new in regressions:
+        print('REGRESSION %-18s %-10s %6s %-14s %.4g -> %.4g (%+.1f%%)' % (
+            codec, kind, format_size(size), metric, old, new, (new / old - 1) * 100))
+    if not regressions:
+        print('no regressions')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='compression benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_run = sub.add_parser('run', help='run benchmarks on synthetic corpora')
+    p_run.add_argument('--codecs', nargs='+', default=list(CODEC_IDS), choices=list(CODEC_IDS))
+    p_run.add_argument('--corpus', nargs='+', default=list(CORPUS_KINDS), choices=CORPUS_KINDS)
+    p_run.add_argument('--sizes', nargs='+', default=['64K', '1M'], help='e.g. 64K 1M 200M')
+    p_run.add_argument('--repeat', type=int, default=5)
+    p_run.add_argument('--warmup', type=int, default=1)
+    p_run.add_argument('--seed', type=int, default=0)
+    p_run.add_argument('--no-memory', action='store_true', help='skip tracemalloc peak memory runs')
+    p_run.add_argument('--output', help='write JSON results to this file')
+    p_run.add_argument('--baseline', help='compare against this JSON file after running')
+    p_run.add_argument('--threshold', type=float, default=0.1)
+    p_cmp = sub.add_parser('compare', help='compare two JSON result files')
+    p_cmp.add_argument('baseline')
+    p_cmp.add_argument('current')
+    p_cmp.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = run(args.codecs, args.corpus, [parse_size(s) for s in args.sizes],
+                      args.repeat, args.warmup, not args.no_memory, args.seed)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+        if not args.baseline:
+            return 0
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            results = json.load(f)
+    regressions = compare(baseline, results, args.threshold)
+    _print_regressions(regressions)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,106 @@
 """
 比特流的读写
+
+BitWriter/BitReader 内部使用大块字节缓冲区和一个64位左右的累加器,
+``write_bits``/``read_bits`` 一次处理整个字(而不是逐比特循环),
+``write_bytes``/``read_bytes`` 为按字节批量读写提供快速路径.
+``open_input`` 把输入文件映射到内存, 各压缩算法按段扫描时不再经过 read 系统调用和数据复制.
 """
+import mmap
+
+BUFFER_SIZE = 1 << 16  # 内部缓冲区大小(字节)
+WORD_BITS = 64  # 累加器按字(64位)批量换入换出
+
+
+def iter_chunks(f, chunk_size=BUFFER_SIZE):
+    """按段读取二进制文件对象, 生成器, 每次产出不超过 chunk_size 的非空 bytes"""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def split_chunks(chunks, chunk_size):
+    """把产出字节段的可迭代对象切分成不超过 chunk_size 的非空段, 生成器"""
+    for chunk in chunks:
+        if len(chunk) <= chunk_size:
+            if chunk:
+                yield chunk
+            continue
+        for start in range(0, len(chunk), chunk_size):
+            yield chunk[start:start + chunk_size]
+
+
+class MappedFile(object):
+    """
+    映射到内存的只读二进制文件对象: read 返回 memoryview 切片, 不经过系统调用也不复制数据;
+    view 是整个文件的 memoryview, 可以当作 bytes 类对象直接扫描
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        self.pos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        end = len(self.view) if size is None or size < 0 else min(self.pos + size, len(self.view))
+        data = self.view[self.pos:end]
+        self.pos = max(self.pos, end)
+        return data
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += len(self.view)
+        if offset < 0:
+            raise ValueError('negative seek position %d' % offset)
+        self.pos = offset
+        return offset
+
+    def close(self):
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:  # 调用方仍持有 read 返回的切片, 映射在切片释放后回收
+            pass
+
+
+def open_input(path):
+    """
+    以只读方式打开输入文件: 尽量映射到内存(MappedFile), 空文件或不能映射的文件(管道等)退回普通文件对象
+    :param path: 文件路径
+    :return: 二进制文件对象, 可用于 with 语句
+    """
+    try:
+        return MappedFile(path)
+    except (ValueError, OSError):
+        return open(path, 'rb')
 
 
 class BitWriter(object):
-    def __init__(self, f):
-        self.accumulator = 0
-        self.bcount = 0
+    def __init__(self, f, buffer_size=BUFFER_SIZE):
+        self.accumulator = 0  # 尚未凑成整字节的比特(最多 WORD_BITS + n 位)
+        self.bcount = 0  # accumulator 中的有效比特数
         self.out = f
+        self.buffer = bytearray()
+        self.buffer_size = buffer_size
 
     def __enter__(self):
         return self
@@ -22,29 +115,74 @@ class BitWriter(object):
             pass
 
     def write_bit(self, bit):
-        if self.bcount == 8:
-            self.flush()
-        if bit:
-            self.accumulator |= 1 << 7 - self.bcount
+        self.accumulator = (self.accumulator << 1) | (1 if bit else 0)
         self.bcount += 1
+        if self.bcount >= WORD_BITS:
+            self._drain()
 
     def write_bits(self, bits, n):
-        while n > 0:
-            self.write_bit(bits & 1 << n - 1)
-            n -= 1
+        """写入 bits 的低 n 位(高位在前), n 可以任意大"""
+        if n <= 0:
+            return
+        self.accumulator = (self.accumulator << n) | (bits & ((1 << n) - 1))
+        self.bcount += n
+        if self.bcount >= WORD_BITS:
+            self._drain()
+
+    def write_gamma(self, n):
+        """Elias gamma 编码写入正整数 n: (位数-1)个0, 再接 n 的二进制"""
+        width = n.bit_length()
+        self.write_bits(n, 2 * width - 1)
+
+    def write_bytes(self, data):
+        """写入一段字节; 字节对齐时直接追加到缓冲区"""
+        if not data:
+            return
+        if not self.bcount:
+            self.buffer += data
+        else:
+            n = len(data) * 8
+            self.accumulator = (self.accumulator << n) | int.from_bytes(data, 'big')
+            self.bcount += n
+            self._drain()
+        if len(self.buffer) >= self.buffer_size:
+            self.out.write(self.buffer)
+            self.buffer = bytearray()
+
+    def _drain(self):
+        """把 accumulator 中的整字节移入缓冲区, 只保留不足一字节的比特"""
+        rem = self.bcount & 7
+        nbytes = self.bcount >> 3
+        self.buffer += (self.accumulator >> rem).to_bytes(nbytes, 'big')
+        self.accumulator &= (1 << rem) - 1
+        self.bcount = rem
+        if len(self.buffer) >= self.buffer_size:
+            self.out.write(self.buffer)
+            self.buffer = bytearray()
 
     def flush(self):
-        self.out.write(bytearray([self.accumulator]))
-        self.accumulator = 0
-        self.bcount = 0
+        """补0凑满最后一个字节, 并将缓冲区全部写入文件"""
+        if self.bcount & 7:
+            pad = 8 - (self.bcount & 7)
+            self.accumulator <<= pad
+            self.bcount += pad
+        if self.bcount:
+            self._drain()
+        if self.buffer:
+            self.out.write(self.buffer)
+            self.buffer = bytearray()
 
 
 class BitReader(object):
-    def __init__(self, f):
+    def __init__(self, f, buffer_size=BUFFER_SIZE):
         self.input = f
         self.accumulator = 0
-        self.bcount = 0
-        self.read = 0
+        self.bcount = 0  # accumulator 中未读的比特数
+        self.read = 0  # 最近一次读取是否拿到了真实数据(0表示已到文件结尾)
+        self.buffer = b''
+        self.pos = 0  # buffer 中下一个未读字节的下标
+        self.buffer_size = buffer_size
+        self.padding = 0  # read_bytes 在输入结尾补上的0比特数
 
     def __enter__(self):
         return self
@@ -52,23 +190,100 @@ class BitReader(object):
     def __exit__(self, exc_type, exc_val, exc_tb):
         pass
 
+    def _fill(self):
+        """从缓冲区(必要时从文件)取出至多一个字到 accumulator, 返回取到的字节数"""
+        if self.pos >= len(self.buffer):
+            self.buffer = self.input.read(self.buffer_size)
+            self.pos = 0
+            if not self.buffer:
+                return 0
+        chunk = self.buffer[self.pos:self.pos + WORD_BITS // 8]
+        self.pos += len(chunk)
+        self.accumulator = ((self.accumulator & ((1 << self.bcount) - 1)) << (len(chunk) * 8)) \
+            | int.from_bytes(chunk, 'big')
+        self.bcount += len(chunk) * 8
+        return len(chunk)
+
     def read_bit(self):
-        if not self.bcount:
-            a = self.input.read(1)
-            if a:
-                self.accumulator = ord(a)
-            self.bcount = 8
-            self.read = len(a)
-        rv = (self.accumulator & (1 << self.bcount - 1)) >> self.bcount - 1
+        if not self.bcount and not self._fill():
+            self.read = 0
+            return 0
         self.bcount -= 1
-        return rv
+        self.read = 1
+        return (self.accumulator >> self.bcount) & 1
 
     def read_bits(self, n):
-        v = 0
+        """读取 n 位并按高位在前组成整数; 输入不足时缺的位补0, 并置 read 为0"""
+        while self.bcount < n:
+            if not self._fill():
+                v = (self.accumulator & ((1 << self.bcount) - 1)) << (n - self.bcount)
+                self.bcount = 0
+                self.read = 0
+                return v
+        self.bcount -= n
+        self.read = 1
+        return (self.accumulator >> self.bcount) & ((1 << n) - 1)
+
+    def read_gamma(self):
+        """读取 Elias gamma 编码的正整数; 到达文件结尾时返回0"""
+        zeros = 0
+        while not self.read_bit():
+            if not self.read:
+                return 0
+            zeros += 1
+        return (1 << zeros) | self.read_bits(zeros)
+
+    def read_bytes(self, n):
+        """读取至多 n 个字节(不要求字节对齐), 返回 bytes; 到达文件结尾时可能少于 n, 末尾不足一字节的比特补0"""
+        # 先取出 accumulator 中的整字节
+        head_bits = min(self.bcount & ~7, n * 8)
+        head = b''
+        if head_bits:
+            self.bcount -= head_bits
+            head = ((self.accumulator >> self.bcount) & ((1 << head_bits) - 1)).to_bytes(head_bits >> 3, 'big')
+            n -= head_bits >> 3
+        # 剩余部分直接从缓冲区/文件切片
+        parts = [head]
         while n > 0:
-            v = (v << 1) | self.read_bit()
-            n -= 1
-        return v
+            if self.pos >= len(self.buffer):
+                self.buffer = self.input.read(max(n, self.buffer_size))
+                self.pos = 0
+                if not self.buffer:
+                    if self.bcount:  # 剩下不足一字节的比特, 补0凑成最后一个字节
+                        self.padding = 8 - self.bcount
+                        parts.append(((self.accumulator & ((1 << self.bcount) - 1))
+                                      << (8 - self.bcount)).to_bytes(1, 'big'))
+                        self.bcount = 0
+                    break
+            raw = self.buffer[self.pos:self.pos + n]
+            self.pos += len(raw)
+            n -= len(raw)
+            if self.bcount:  # 未对齐: 整段移位拼接
+                rem = self.bcount
+                v = ((self.accumulator & ((1 << rem) - 1)) << (len(raw) * 8)) | int.from_bytes(raw, 'big')
+                self.accumulator = v & ((1 << rem) - 1)
+                raw = (v >> rem).to_bytes(len(raw), 'big')
+            parts.append(raw)
+        data = b''.join(parts)
+        self.read = len(data)
+        return data
+
+    def remaining_bits(self, limit):
+        """
+        取出剩下未读的比特, 最多再从输入读 limit 个字节; 用于自定界的数据读完后检查之后还有什么
+        :return: (值, 比特数), 高位在前
+        """
+        rem = self.bcount
+        value = self.accumulator & ((1 << rem) - 1)
+        data = bytes(self.buffer[self.pos:self.pos + limit])
+        self.pos += len(data)
+        while len(data) < limit:
+            more = self.input.read(limit - len(data))
+            if not more:
+                break
+            data += more
+        self.bcount = 0
+        return value << (len(data) * 8) | int.from_bytes(data, 'big'), rem + len(data) * 8
 
 
 if __name__ == '__main__':
@@ -0,0 +1,135 @@
+"""
+压缩数据的完整性校验
+
+压缩时在压缩数据之后追加16字节的尾部: magic(4字节) + 原始数据的CRC32(4字节) + 原始长度(8字节),
+解压时边输出边计算CRC32, 最后与尾部比较. 两端都按段处理, 内存占用与输入大小无关.
+压缩数据本身不记录是否有尾部; 不校验地解压时, 以结束标记结束或头部记录了长度的压缩数据(Huffman, LZW, LZSS)读完后,
+剩下的输入恰好是一个尾部则报错(见 reject_trailer). 游程编码读到输入结尾为止, 不做这个检查.
+"""
+import struct
+import zlib
+
+from bitio import BUFFER_SIZE
+
+TRAILER = struct.Struct('>4sIQ')  # magic, CRC32, 原始长度
+MAGIC = b'CRC1'
+
+
+class ChecksumReader(object):
+    """
+    包装可读的二进制文件对象, 读取时累计CRC32和长度.
+    Huffman要读两轮输入, 所以允许 seek 回到开始读取的位置, 此时重新计数
+    """
+    def __init__(self, f):
+        self.f = f
+        self.crc = 0
+        self.length = 0
+        self.start = f.tell() if self.seekable() else 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.crc = zlib.crc32(data, self.crc)
+        self.length += len(data)
+        return data
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return hasattr(self.f, 'seekable') and self.f.seekable()
+
+    def tell(self):
+        return self.f.tell()
+
+    def seek(self, offset, whence=0):
+        pos = self.f.seek(offset, whence)
+        if pos != self.start:
+            raise ValueError('ChecksumReader can only seek back to where reading started')
+        self.crc, self.length = 0, 0
+        return pos
+
+    def trailer(self):
+        """已读数据的校验尾部"""
+        return TRAILER.pack(MAGIC, self.crc, self.length)
+
+
+class TrailerReader(object):
+    """
+    包装可读的二进制文件对象, read 时始终留住最后 TRAILER.size 个字节不返回,
+    这样读到结尾为止的解码器(如游程编码)不会把校验尾部当作压缩数据
+    """
+    def __init__(self, f):
+        self.f = f
+        self.pending = bytearray()  # 已从 f 读出但还未返回的字节, 末尾是可能的校验尾部
+        self.eof = False
+
+    def read(self, size=-1):
+        keep = TRAILER.size
+        while not self.eof and (size is None or size < 0 or len(self.pending) < size + keep):
+            chunk = self.f.read(BUFFER_SIZE if size is None or size < 0 else max(size, BUFFER_SIZE))
+            if not chunk:
+                self.eof = True
+                break
+            self.pending += chunk
+        n = len(self.pending) - keep
+        if size is not None and size >= 0:
+            n = min(n, size)
+        if n <= 0:
+            return b''
+        data = bytes(self.pending[:n])
+        del self.pending[:n]
+        return data
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def trailer(self):
+        """跳过解码器没有读取的剩余压缩数据, 返回校验尾部"""
+        while self.read(BUFFER_SIZE):
+            pass
+        if len(self.pending) < TRAILER.size:
+            raise ValueError('checksum trailer missing: input too short')
+        return bytes(self.pending)
+
+
+def verify(chunks, reader):
+    """
+    边产出解压数据边计算CRC32, 结束时与压缩数据的校验尾部比较, 生成器
+    :param chunks: 依次产出解压后字节段的可迭代对象
+    :param reader: 读取压缩数据的 TrailerReader
+    :return:
+    """
+    crc, length = 0, 0
+    for chunk in chunks:
+        crc = zlib.crc32(chunk, crc)
+        length += len(chunk)
+        yield chunk
+    magic, expected_crc, expected_len = TRAILER.unpack(reader.trailer())
+    if magic != MAGIC:
+        raise ValueError('checksum trailer missing: bad magic %r' % magic)
+    if expected_len != length:
+        raise ValueError('length mismatch: expected %d bytes, got %d' % (expected_len, length))
+    if expected_crc != crc:
+        raise ValueError('checksum mismatch: expected %08x, got %08x' % (expected_crc, crc))
+
+
+def reject_trailer(reader, value=0, nbits=0):
+    """
+    不校验地解压时, 自定界的压缩数据(以结束标记结束, 或头部记录了长度)读完后检查剩下的输入:
+    除去补齐字节边界的比特后恰好是一个校验尾部, 说明压缩时 checksum=True, 抛出 ValueError.
+    只看压缩数据之后的字节, 不会把恰好以 MAGIC 开头的压缩数据误认为尾部; 校验时 TrailerReader 不返回尾部, 剩下的输入为空
+    :param reader: BitReader
+    :param value: 解码器已从 reader 取出但没有用到的比特(高位在前), 可能以 read_bytes 在输入结尾补上的0结束
+    :param nbits: value 的比特数
+    :return:
+    """
+    if reader.padding:  # 补上的0不是输入的内容
+        value, nbits = (value >> reader.padding, nbits - reader.padding) if nbits > reader.padding else (0, 0)
+    rest, n = reader.remaining_bits(TRAILER.size + 1)
+    value, nbits = value << n | rest, nbits + n
+    if nbits >> 3 == TRAILER.size and \
+            (value & ((1 << (nbits & ~7)) - 1)).to_bytes(TRAILER.size, 'big').startswith(MAGIC):
+        raise ValueError('input ends with a checksum trailer: expand with checksum=True')
@@ -0,0 +1,178 @@
+"""
+批量压缩/解压命令行工具: 文件或整个目录树, 在进程池中并行处理, 已是最新的输出自动跳过
+
+    python3 cli.py compress -c lzw-variable -j 8 logs/          # logs/ 下每个文件 -> 同目录的 *.lzw-variable
+    python3 cli.py compress -c huffman -o archive/ logs/ a.txt  # 输出到 archive/, 保持相对目录结构
+    python3 cli.py expand archive/                              # 按扩展名识别算法
+    python3 cli.py compress -c lzss-huffman - < big.log > big.log.lzss-huffman   # '-' 表示标准输入/输出
+
+压缩文件的扩展名是算法名称(见 container.CODECS), 解压时据此选择算法和模式.
+输出先写到同目录的临时文件, 完成后再改名, 中断的任务不会留下看似完整的输出;
+输出文件比输入新时认为已是最新, 跳过(--force 强制重新处理).
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from container import CODECS, CODEC_IDS
+
+# 可以在命令行中选择的算法(raw 不做任何处理, 不提供)
+CLI_CODECS = [name for name in CODEC_IDS if name != 'raw']
+DEFAULT_CODEC = 'huffman'
+CHUNKSIZE = 64  # 每次分发给工作进程的文件数, 大量小文件时减少进程间通信
+
+
+def _codec(name):
+    _, alg, mode = CODECS[CODEC_IDS[name]]
+    return alg, mode
+
+
+def suffix_codec(path):
+    """按扩展名识别算法名称, 不是压缩文件时返回 None"""
+    ext = os.path.splitext(path)[1][1:]
+    return ext if ext in CLI_CODECS else None
+
+
+def plan(action, paths, codec=None, output_dir=None):
+    """
+    列出要处理的文件
+    :param action: 'compress' 或 'expand'
+    :param paths: 文件或目录; 目录递归处理其中的文件
+    :param codec: 算法名称; 解压时为None表示按扩展名识别
+    :param output_dir: 输出目录, None表示输出到输入文件所在的目录
+    :return: [(输入文件, 输出文件, 算法名称)]
+    """
+    tasks = []
+    for path in paths:
+        if os.path.isdir(path):
+            root = path
+            files = sorted(os.path.join(d, f) for d, _, names in os.walk(path) for f in names)
+        else:
+            root = os.path.dirname(path)
+            files = [path]
+        for src in files:
+            if action == 'compress':
+                if suffix_codec(src):  # 已经是压缩文件
+                    continue
+                name = codec
+                dst = src + '.' + name
+            else:
+                name = suffix_codec(src)
+                if name is None or (codec is not None and name != codec):
+                    continue
+                dst = os.path.splitext(src)[0]
+            if output_dir is not None:
+                dst = os.path.join(output_dir, os.path.relpath(dst, root or os.curdir))
+            tasks.append((src, dst, name))
+    return tasks
+
+
+def up_to_date(src, dst):
+    """输出文件存在且不比输入文件旧"""
+    try:
+        return os.stat(dst).st_mtime_ns >= os.stat(src).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def run_one(action, src, dst, codec, checksum=False, force=False):
+    """
+    处理一个文件(在工作进程中执行)
+    :return: (输入文件, 状态 'done'/'skipped'/'failed', 输入字节数, 输出字节数, 错误信息)
+    """
+    try:
+        if not force and up_to_date(src, dst):
+            return src, 'skipped', 0, 0, ''
+        alg, mode = _codec(codec)
+        os.makedirs(os.path.dirname(dst) or os.curdir, exist_ok=True)
+        tmp = '%s.%d.tmp' % (dst, os.getpid())
+        try:
+            if action == 'compress':
+                alg.compress(src, tmp, mode=mode, checksum=checksum)
+            else:
+                alg.expand(src, tmp, mode=mode, checksum=checksum)
+            os.replace(tmp, dst)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return src, 'done', os.path.getsize(src), os.path.getsize(dst), ''
+    except Exception as e:  # 一个文件失败不影响其他文件
+        return src, 'failed', 0, 0, '%s: %s' % (type(e).__name__, e)
+
+
+def _run_task(args):
+    return run_one(*args)
+
+
+def run(action, tasks, jobs=None, checksum=False, force=False, log=sys.stderr, verbose=False):
+    """
+    处理全部文件
+    :param action: 'compress' 或 'expand'
+    :param tasks: plan 的结果
+    :param jobs: 工作进程数, None表示CPU核数, 1表示在当前进程中执行
+    :param checksum: 见各算法的 compress/expand
+    :param force: 是否重新处理已是最新的输出
+    :param log: 输出进度和汇总的文件对象
+    :param verbose: 是否逐个文件输出结果
+    :return: 失败的文件数
+    """
+    args = [(action, src, dst, codec, checksum, force) for src, dst, codec in tasks]
+    counts = {'done': 0, 'skipped': 0, 'failed': 0}
+    size_in = size_out = 0
+    start = time.perf_counter()
+    if jobs == 1 or len(args) <= 1:
+        results = map(_run_task, args)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(jobs)
+        results = executor.map(_run_task, args, chunksize=CHUNKSIZE)
+    try:
+        for src, status, n_in, n_out, error in results:
+            counts[status] += 1
+            size_in += n_in
+            size_out += n_out
+            if status == 'failed':
+                print('FAILED %s: %s' % (src, error), file=log)
+            elif verbose:
+                print('%-7s %s' % (status, src), file=log)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print('%d done, %d skipped, %d failed; %d -> %d bytes in %.2fs' % (
+        counts['done'], counts['skipped'], counts['failed'], size_in, size_out, time.perf_counter() - start), file=log)
+    return counts['failed']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='batch compression')
+    parser.add_argument('action', choices=('compress', 'expand'))
+    parser.add_argument('paths', nargs='+', help="files or directories; '-' for stdin -> stdout")
+    parser.add_argument('-c', '--codec', choices=CLI_CODECS,
+                        help='codec (default %s when compressing; inferred from the suffix when expanding)'
+                             % DEFAULT_CODEC)
+    parser.add_argument('-o', '--output-dir', help='write outputs here, mirroring the input tree')
+    parser.add_argument('-j', '--jobs', type=int, help='worker processes (default: number of CPUs)')
+    parser.add_argument('-f', '--force', action='store_true', help='rewrite outputs that are up to date')
+    parser.add_argument('--checksum', action='store_true', help='write/verify CRC32 trailers')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.paths == ['-']:
+        codec = args.codec or DEFAULT_CODEC
+        alg, mode = _codec(codec)
+        func = alg.compress_stream if args.action == 'compress' else alg.expand_stream
+        func(sys.stdin.buffer, sys.stdout.buffer, mode=mode, checksum=args.checksum)
+        sys.stdout.buffer.flush()
+        return 0
+    if '-' in args.paths:
+        parser.error("'-' cannot be combined with other paths")
+    codec = args.codec or (DEFAULT_CODEC if args.action == 'compress' else None)
+    tasks = plan(args.action, args.paths, codec, args.output_dir)
+    failed = run(args.action, tasks, args.jobs, args.checksum, args.force, verbose=args.verbose)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
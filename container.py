@@ -0,0 +1,659 @@
+"""
+分块容器格式: 输入切分成相互独立的块, 每块用任一压缩算法单独压缩, 块前记录长度,
+因此压缩和解压都可以在多个进程中并行进行.
+
+文件格式:
+    文件头: magic(4字节) + 版本(1字节)
+    块(重复): 算法编号(1字节) + 原始长度(4字节) + 压缩后长度(4字节) + 压缩数据
+    索引(可选, seekable=True时写入):
+        0xFF(1字节)
+        每块一项: 原始偏移(8字节) + 块在文件中的偏移(8字节) + 算法编号(1字节)
+        索引偏移(8字节) + 块数(4字节) + magic(4字节)
+有索引时可以只解压覆盖某段原始数据的几个块(随机访问); 没有索引时顺序扫描块头也能得到同样的信息.
+块之间没有依赖, 所以可以在已有文件的最后一块之后继续追加新的块(append), 再把多次追加形成的小块合并(compact).
+
+codec='auto' 时每块根据抽样统计(字节熵, 平均比特游程长度, 重复4字节片段的比例)估计各算法的压缩率,
+选出最好的一个; 压缩后不比原数据小则原样存储(raw). 选中的算法记录在块头的算法编号中.
+"""
+import bisect
+import io
+import math
+import os
+import struct
+from collections import Counter
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+
+from bitio import iter_chunks, open_input
+from RunLength import RunLength
+from Huffman import Huffman
+from LZW import LZW
+from LZSS import LZSS
+
+
+class Raw:
+    """
+    不压缩, 原样存储
+    """
+    modes = ('stored',)
+
+    @staticmethod
+    def compress_bytes(data, mode='stored'):
+        return bytes(data)
+
+    @staticmethod
+    def expand_bytes(data, mode='stored'):
+        return bytes(data)
+
+
+# 算法编号 -> (名称, 算法, 模式)
+CODECS = {
+    0: ('raw', Raw, 'stored'),
+    1: ('rl', RunLength, 'fixed'),
+    2: ('rl-varint', RunLength, 'varint'),
+    3: ('huffman', Huffman, 'trie'),
+    4: ('huffman-canonical', Huffman, 'canonical'),
+    5: ('lzw', LZW, 'fixed'),
+    6: ('lzw-variable', LZW, 'variable'),
+    7: ('huffman-block', Huffman, 'block'),
+    8: ('lzss', LZSS, 'bits'),
+    9: ('lzss-huffman', LZSS, 'huffman'),
+}
+CODEC_IDS = {name: codec_id for codec_id, (name, _, _) in CODECS.items()}
+AUTO = 'auto'  # 每块自动选择算法
+
+
+def _compress_block(codec_id, data):
+    """
+    压缩一个块(在工作进程中执行)
+    :param codec_id: 算法编号, None表示自动选择
+    :param data: 原始数据
+    :return: (实际使用的算法编号, 压缩数据)
+    """
+    auto = codec_id is None
+    if auto:
+        codec_id = Container.choose_codec(data)
+    _, codec, mode = CODECS[codec_id]
+    payload = codec.compress_bytes(data, mode)
+    if auto and len(payload) >= len(data):  # 压缩没有效果, 原样存储
+        return CODEC_IDS['raw'], bytes(data)
+    return codec_id, payload
+
+
+def _expand_block(codec_id, data):
+    """解压一个块(在工作进程中执行)"""
+    _, codec, mode = CODECS[codec_id]
+    return codec.expand_bytes(data, mode)
+
+
+def _compact_block(codec_id, raw_len, data, payload):
+    """
+    整理时处理一个块(在工作进程中执行): 压缩合并后的原始数据, 或原样保留不需要合并的块
+    :param codec_id: 算法编号, None表示自动选择
+    :param raw_len: 原始长度
+    :param data: 合并后的原始数据
+    :param payload: 原样保留的块的压缩数据, None表示需要压缩 data
+    :return: (实际使用的算法编号, 压缩数据)
+    """
+    if payload is not None:
+        return codec_id, payload
+    return _compress_block(codec_id, data)
+
+
+class Container:
+    """
+    分块并行压缩
+    """
+    magic = b'CMPB'
+    version = 1
+    header = struct.Struct('>4sB')  # magic, 版本
+    frame = struct.Struct('>BII')  # 算法编号, 原始长度, 压缩后长度
+    index_id = 0xFF  # 索引开始的标记(代替算法编号)
+    index_entry = struct.Struct('>QQB')  # 原始偏移, 块偏移, 算法编号
+    footer = struct.Struct('>QI4s')  # 索引偏移, 块数, magic
+    index_magic = b'CIDX'
+    block_size = 1 << 20  # 默认块大小
+    sample_size = 1 << 16  # 自动选择算法时, 每块抽样的字节数
+    sample_slices = 4  # 抽样分成几段, 均匀分布在块中
+    ngram_len = 4  # 统计重复片段时的片段长度
+
+    @staticmethod
+    def compress(origin_filepath, compress_filepath, codec='huffman', block_size=block_size, workers=None,
+                 seekable=False):
+        """
+        将``原始文件``分块压缩到``压缩文件``中
+        :param origin_filepath: 原始文件
+        :param compress_filepath: 压缩文件
+        :param codec: 算法名称, 见 CODECS; 'auto' 每块根据抽样统计自动选择
+        :param block_size: 块大小(字节)
+        :param workers: 工作进程数, None表示CPU核数, 1表示在当前进程中执行
+        :param seekable: 是否在文件末尾写入块索引, 供 read_range/open 随机访问
+        :return: 没有返回值
+        """
+        with open_input(origin_filepath) as ori_f, open(compress_filepath, 'wb') as com_f:
+            Container.compress_stream(ori_f, com_f, codec, block_size, workers, seekable)
+
+    @staticmethod
+    def expand(compress_filepath, origin_filepath, workers=None):
+        """
+        将``压缩文件``, 解压写到``原始文件``中
+        :param compress_filepath: 压缩文件
+        :param origin_filepath: 原始文件
+        :param workers: 工作进程数, 见 compress
+        :return: 不返回任何值
+        """
+        with open_input(compress_filepath) as com_f, open(origin_filepath, 'wb') as ori_f:
+            Container.expand_stream(com_f, ori_f, workers)
+
+    @staticmethod
+    def compress_bytes(data, codec='huffman', block_size=block_size, workers=None, seekable=False):
+        """压缩内存中的字节, 返回压缩后的字节"""
+        dst = io.BytesIO()
+        Container.compress_stream(io.BytesIO(data), dst, codec, block_size, workers, seekable)
+        return dst.getvalue()
+
+    @staticmethod
+    def expand_bytes(data, workers=None):
+        """解压内存中的字节, 返回解压后的字节"""
+        dst = io.BytesIO()
+        Container.expand_stream(io.BytesIO(data), dst, workers)
+        return dst.getvalue()
+
+    @staticmethod
+    def compress_stream(src, dst, codec='huffman', block_size=block_size, workers=None, seekable=False):
+        """
+        从二进制文件对象 src 按块读取, 并行压缩后按原顺序写入 dst
+        :param src: 可读的二进制文件对象
+        :param dst: 可写的二进制文件对象
+        :param codec: 算法名称, 见 CODECS
+        :param block_size: 块大小(字节)
+        :param workers: 工作进程数, 见 compress
+        :param seekable: 见 compress
+        :return: 没有返回值
+        """
+        if codec != AUTO and codec not in CODEC_IDS:
+            raise ValueError('unknown codec: %r' % codec)
+        if block_size <= 0:
+            raise ValueError('block_size must be positive')
+        requested = None if codec == AUTO else CODEC_IDS[codec]
+        dst.write(Container.header.pack(Container.magic, Container.version))
+        blocks = ((requested, block) for block in Container._blocks(src, block_size))
+        results = ((len(block), codec_id, payload)
+                   for (_, block), (codec_id, payload) in Container._map(_compress_block, blocks, workers))
+        index = []
+        offset = Container._write_frames(dst, results, index, 0, Container.header.size)  # 偏移都相对于容器的开头
+        if seekable:
+            Container._write_index(dst, index, offset)
+
+    @staticmethod
+    def _write_frames(dst, results, index, raw_offset, offset):
+        """
+        依次写入各块, 并记入索引
+        :param dst: 可写的二进制文件对象
+        :param results: 产出(原始长度, 算法编号, 压缩数据)的可迭代对象
+        :param index: 块索引 [(原始偏移, 块偏移, 算法编号)], 新的块追加在后面
+        :param raw_offset: 第一块的原始偏移
+        :param offset: 第一块在容器中的偏移
+        :return: 块结束的偏移
+        """
+        for raw_len, codec_id, payload in results:
+            dst.write(Container.frame.pack(codec_id, raw_len, len(payload)))
+            dst.write(payload)
+            index.append((raw_offset, offset, codec_id))
+            raw_offset += raw_len
+            offset += Container.frame.size + len(payload)
+        return offset
+
+    @staticmethod
+    def _write_index(dst, index, offset):
+        """
+        写入块索引
+        :param dst: 可写的二进制文件对象
+        :param index: [(原始偏移, 块偏移, 算法编号)]
+        :param offset: 索引在容器中的偏移
+        :return:
+        """
+        dst.write(bytes((Container.index_id,)))
+        dst.write(b''.join(Container.index_entry.pack(*entry) for entry in index))
+        dst.write(Container.footer.pack(offset, len(index), Container.index_magic))
+
+    @staticmethod
+    def expand_stream(src, dst, workers=None):
+        """
+        从二进制文件对象 src 读取各块, 并行解压后按原顺序写入 dst
+        :param src: 可读的二进制文件对象
+        :param dst: 可写的二进制文件对象
+        :param workers: 工作进程数, 见 compress
+        :return: 没有返回值
+        """
+        frames = ((codec_id, payload) for codec_id, _, payload in Container._frames(src))
+        for (codec_id, _), data in Container._map(_expand_block, frames, workers):
+            dst.write(data)
+
+    @staticmethod
+    def append(origin_filepath, compress_filepath, codec='huffman', block_size=block_size, workers=None,
+               seekable=None):
+        """
+        把``原始文件``分块压缩, 作为新的块追加到``压缩文件``末尾, 已有的块不解压也不重新压缩; 压缩文件不存在时新建.
+        解压时各次追加的数据依次连接, 与一次压缩的结果相同
+        :param origin_filepath: 原始文件
+        :param compress_filepath: 压缩文件(容器格式)
+        :param codec: 新的块使用的算法, 见 compress
+        :param block_size: 块大小(字节)
+        :param workers: 工作进程数, 见 compress
+        :param seekable: 是否写入块索引, None表示与压缩文件原来一致
+        :return: 没有返回值
+        """
+        mode = 'r+b' if os.path.exists(compress_filepath) else 'w+b'  # 已存在时不能截断
+        with open_input(origin_filepath) as ori_f, open(compress_filepath, mode) as com_f:
+            Container.append_stream(ori_f, com_f, codec, block_size, workers, seekable)
+
+    @staticmethod
+    def append_stream(src, dst, codec='huffman', block_size=block_size, workers=None, seekable=None):
+        """
+        从二进制文件对象 src 按块读取, 压缩后追加到容器 dst 的最后一块之后.
+        原来有尾部索引时先去掉, 追加完再写入包含全部块的新索引;
+        上一次追加中断留下的不完整的块(或索引)被丢弃, 从最后一个完整的块之后继续写
+        :param src: 可读的二进制文件对象
+        :param dst: 可读写, 可 seek 的二进制文件对象, 内容是容器格式, 为空时写入文件头
+        :param codec: 见 append
+        :param block_size: 见 append
+        :param workers: 见 append
+        :param seekable: 见 append
+        :return: 没有返回值
+        """
+        if codec != AUTO and codec not in CODEC_IDS:
+            raise ValueError('unknown codec: %r' % codec)
+        if block_size <= 0:
+            raise ValueError('block_size must be positive')
+        requested = None if codec == AUTO else CODEC_IDS[codec]
+        size = dst.seek(0, io.SEEK_END)
+        if size:
+            raw_offsets, offsets, codec_ids, raw_offset, end, indexed = Container._layout(dst)
+            if end > size:  # 最后一块的压缩数据不完整
+                end, raw_offset = offsets.pop(), raw_offsets.pop()
+                codec_ids.pop()
+            index = list(zip(raw_offsets, offsets, codec_ids))
+        else:
+            dst.write(Container.header.pack(Container.magic, Container.version))
+            index, raw_offset, end, indexed = [], 0, Container.header.size, False
+        dst.seek(end)
+        dst.truncate()
+        blocks = ((requested, block) for block in Container._blocks(src, block_size))
+        results = ((len(block), codec_id, payload)
+                   for (_, block), (codec_id, payload) in Container._map(_compress_block, blocks, workers))
+        offset = Container._write_frames(dst, results, index, raw_offset, end)
+        if indexed if seekable is None else seekable:
+            Container._write_index(dst, index, offset)
+
+    @staticmethod
+    def compact(compress_filepath, block_size=block_size, codec=None, workers=None):
+        """
+        整理多次追加形成的压缩文件: 连续的小块(原始长度小于 block_size)解压后合并成 block_size 大小的块重新压缩,
+        其余的块原样复制. 先写入临时文件, 完成后替换原文件; 原来有索引时保留索引
+        :param compress_filepath: 压缩文件(容器格式)
+        :param block_size: 合并后的块大小(字节)
+        :param codec: 合并后的块使用的算法名称(可以是 'auto'), None表示沿用每组小块中第一块的算法
+        :param workers: 工作进程数, 见 compress
+        :return: 没有返回值
+        """
+        tmp = '%s.%d.tmp' % (compress_filepath, os.getpid())
+        try:
+            with open(compress_filepath, 'rb') as com_f:
+                indexed = Container._layout(com_f)[5]
+                com_f.seek(0)
+                with open(tmp, 'wb') as tmp_f:
+                    Container.compact_stream(com_f, tmp_f, block_size, codec, workers, indexed)
+            os.replace(tmp, compress_filepath)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    @staticmethod
+    def compact_stream(src, dst, block_size=block_size, codec=None, workers=None, seekable=False):
+        """
+        读取容器 src, 合并连续的小块后写入 dst, 见 compact
+        :param src: 可读的二进制文件对象
+        :param dst: 可写的二进制文件对象
+        :param block_size: 见 compact
+        :param codec: 见 compact
+        :param workers: 见 compact
+        :param seekable: 是否写入块索引
+        :return: 没有返回值
+        """
+        if codec is not None and codec != AUTO and codec not in CODEC_IDS:
+            raise ValueError('unknown codec: %r' % codec)
+        if block_size <= 0:
+            raise ValueError('block_size must be positive')
+        items = Container._merge_frames(Container._frames(src), block_size, codec)
+        results = ((raw_len, codec_id, payload)
+                   for (_, raw_len, _, _), (codec_id, payload) in Container._map(_compact_block, items, workers))
+        dst.write(Container.header.pack(Container.magic, Container.version))
+        index = []
+        offset = Container._write_frames(dst, results, index, 0, Container.header.size)
+        if seekable:
+            Container._write_index(dst, index, offset)
+
+    @staticmethod
+    def _merge_frames(frames, block_size, codec=None):
+        """
+        合并连续的小块, 生成器, 依次产出 _compact_block 的参数.
+        只有一块的一组小块原样保留; 合并时边解压边切分, 内存占用只与块大小有关
+        :param frames: _frames 的结果
+        :param block_size: 见 compact
+        :param codec: 见 compact
+        :return:
+        """
+        single = None  # 当前这组小块只有一块时, 暂不解压
+        buf = None  # 当前这组小块合并中的原始数据, None表示还没有开始合并
+        target = None  # 合并后的块使用的算法编号
+        for frame in chain(frames, (None,)):  # 最后的 None 结束最后一组小块
+            if frame is not None and frame[1] < block_size:
+                codec_id, _, payload = frame
+                if single is None and buf is None:
+                    single = frame
+                    continue
+                if buf is None:  # 第二个小块, 开始合并
+                    if codec is None:
+                        target = single[0]
+                    else:
+                        target = None if codec == AUTO else CODEC_IDS[codec]
+                    buf = bytearray(_expand_block(single[0], single[2]))
+                    single = None
+                buf += _expand_block(codec_id, payload)
+                while len(buf) >= block_size:
+                    yield target, block_size, bytes(buf[:block_size]), None
+                    del buf[:block_size]
+                continue
+            if single is not None:
+                yield single[0], single[1], None, single[2]
+            elif buf:
+                yield target, len(buf), bytes(buf), None
+            single = buf = None
+            if frame is not None:
+                yield frame[0], frame[1], None, frame[2]
+
+    @staticmethod
+    def _blocks(src, block_size):
+        """按块读取, 生成器; 流式输入一次 read 可能不足一块, 凑满再产出"""
+        buf = bytearray()
+        for chunk in iter_chunks(src, block_size):
+            buf += chunk
+            while len(buf) >= block_size:
+                yield bytes(buf[:block_size])
+                del buf[:block_size]
+        if buf:
+            yield bytes(buf)
+
+    @staticmethod
+    def _read_header(src):
+        """读取并检查文件头"""
+        head = src.read(Container.header.size)
+        if len(head) < Container.header.size:
+            raise ValueError('not a container file: too short')
+        magic, version = Container.header.unpack(head)
+        if magic != Container.magic:
+            raise ValueError('not a container file: bad magic %r' % magic)
+        if version != Container.version:
+            raise ValueError('unsupported container version: %d' % version)
+
+    @staticmethod
+    def _frames(src):
+        """
+        依次读取各块, 生成器, 每次产出(算法编号, 原始长度, 压缩数据)
+        :param src: 可读的二进制文件对象
+        :return:
+        """
+        Container._read_header(src)
+        while True:
+            head = src.read(Container.frame.size)
+            if not head:
+                return
+            if len(head) < Container.frame.size:
+                raise ValueError('truncated frame header')
+            if head[0] == Container.index_id:  # 块已经读完, 后面是索引
+                return
+            codec_id, raw_len, comp_len = Container.frame.unpack(head)
+            if codec_id not in CODECS:
+                raise ValueError('unknown codec id: %d' % codec_id)
+            payload = src.read(comp_len)
+            if len(payload) < comp_len:
+                raise ValueError('truncated frame payload')
+            yield codec_id, raw_len, payload
+
+    @staticmethod
+    def sample_stats(data):
+        """
+        抽样统计: 在块中均匀取 sample_slices 段, 共约 sample_size 字节
+        :param data: 一块原始数据
+        :return: (字节熵(比特/字节), 平均比特游程长度, 重复出现的 ngram_len 字节片段的比例, 不同字节的个数)
+        """
+        if len(data) > Container.sample_size:
+            step = len(data) // Container.sample_slices
+            part = Container.sample_size // Container.sample_slices
+            sample = b''.join(data[i * step:i * step + part] for i in range(Container.sample_slices))
+        else:
+            sample = bytes(data)
+        n = len(sample)
+        if not n:
+            return 0.0, 0.0, 0.0, 0
+        counts = Counter(sample).values()
+        entropy = -sum(c / n * math.log2(c / n) for c in counts)
+        # 相邻比特不同的位置数 + 1 就是游程个数
+        bits = int.from_bytes(sample, 'big')
+        nbits = n * 8
+        runs = ((bits ^ (bits >> 1)) & ((1 << (nbits - 1)) - 1)).bit_count() + 1
+        k = Container.ngram_len
+        grams = n - k + 1
+        repeat = 1 - len({sample[i:i + k] for i in range(grams)}) / grams if grams > 0 else 0.0
+        return entropy, nbits / runs, repeat, len(counts)
+
+    @staticmethod
+    def choose_codec(data):
+        """
+        根据抽样统计估计各算法的压缩率(压缩后/压缩前), 返回估计最小的算法编号:
+        Huffman约为 熵/8 加上编码长度表; 变长游程约为 (2*log2(平均游程)+1)/平均游程;
+        LZW随重复片段比例增加而变好, 按经验取 1.25*(1-重复比例)+0.1
+        :param data: 一块原始数据
+        :return: 算法编号
+        """
+        entropy, bit_run, repeat, symbols = Container.sample_stats(data)
+        if not data:
+            return CODEC_IDS['raw']
+        estimates = {
+            'raw': 1.0,
+            'huffman-canonical': entropy / 8 + symbols * 7 / 8 / len(data),
+            'rl-varint': (2 * math.log2(bit_run) + 1) / bit_run,
+            'lzw-variable': 1.25 * (1 - repeat) + 0.1,
+        }
+        return CODEC_IDS[min(estimates, key=estimates.get)]
+
+    @staticmethod
+    def read_range(compress_filepath, start, length):
+        """
+        只解压覆盖原始数据 [start, start+length) 的块, 返回这段原始数据
+        :param compress_filepath: 压缩文件
+        :param start: 原始数据中的起始偏移
+        :param length: 长度
+        :return: bytes, 超出原始数据末尾的部分被截掉
+        """
+        with Container.open(compress_filepath) as reader:
+            reader.seek(start)
+            return reader.read(length)
+
+    @staticmethod
+    def open(compress_filepath):
+        """打开压缩文件, 返回支持 seek()/read() 的 ContainerReader"""
+        return ContainerReader(open(compress_filepath, 'rb'), close_file=True)
+
+    @staticmethod
+    def _index(f):
+        """
+        读取块索引: 有尾部索引时直接读取, 否则顺序扫描各块的块头(跳过压缩数据)
+        :param f: 可 seek 的二进制文件对象, 容器从偏移0开始
+        :return: ([原始偏移], [块偏移], [算法编号], 原始数据总长度)
+        """
+        return Container._layout(f)[:4]
+
+    @staticmethod
+    def _layout(f):
+        """
+        与 _index 相同, 另外返回块结束的位置: 有尾部索引时是索引的偏移, 否则是扫描到的最后一块之后
+        (最后一块被截断时会超出文件末尾, 块头不完整时在文件末尾之前)
+        :param f: 可 seek 的二进制文件对象, 容器从偏移0开始
+        :return: ([原始偏移], [块偏移], [算法编号], 原始数据总长度, 块结束的偏移, 是否有尾部索引)
+        """
+        size = f.seek(0, io.SEEK_END)
+        f.seek(0)
+        Container._read_header(f)
+        if size >= Container.header.size + 1 + Container.footer.size:
+            f.seek(size - Container.footer.size)
+            offset, count, magic = Container.footer.unpack(f.read(Container.footer.size))
+            entries_size = count * Container.index_entry.size
+            if magic == Container.index_magic and offset + 1 + entries_size + Container.footer.size == size:
+                f.seek(offset)
+                if f.read(1)[0] == Container.index_id:
+                    entries = list(Container.index_entry.iter_unpack(f.read(entries_size)))
+                    total = 0
+                    if entries:
+                        f.seek(entries[-1][1])
+                        total = entries[-1][0] + Container.frame.unpack(f.read(Container.frame.size))[1]
+                    return [e[0] for e in entries], [e[1] for e in entries], [e[2] for e in entries], total, \
+                        offset, True
+        raw_offsets, offsets, codec_ids = [], [], []
+        total, offset = 0, Container.header.size
+        f.seek(offset)
+        while True:
+            head = f.read(Container.frame.size)
+            if len(head) < Container.frame.size or head[0] == Container.index_id:
+                break
+            codec_id, raw_len, comp_len = Container.frame.unpack(head)
+            raw_offsets.append(total)
+            offsets.append(offset)
+            codec_ids.append(codec_id)
+            total += raw_len
+            offset += Container.frame.size + comp_len
+            f.seek(offset)
+        return raw_offsets, offsets, codec_ids, total, offset, False
+
+    @staticmethod
+    def _map(func, items, workers):
+        """
+        在进程池中计算 func(*item), 生成器, 按输入顺序产出 (item, 结果).
+        同时在途的任务不超过工作进程数的两倍, 内存占用有界.
+        先取出至多 workers 项: 只有一项时在当前进程中执行(启动进程池比压缩一小块还慢), 不足 workers 项时只启动这么多进程
+        :param func: 模块级函数(需能被pickle)
+        :param items: 参数元组的可迭代对象
+        :param workers: 工作进程数, None表示CPU核数, 1表示在当前进程中执行
+        :return:
+        """
+        workers = workers or os.cpu_count() or 1
+        items = iter(items)
+        head = list(islice(items, workers))
+        items = chain(head, items)
+        if len(head) <= 1:
+            for item in items:
+                yield item, func(*item)
+            return
+        workers = len(head)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for item in items:
+                pending.append((item, executor.submit(func, *item)))
+                if len(pending) >= 2 * workers:
+                    item, future = pending.popleft()
+                    yield item, future.result()
+            while pending:
+                item, future = pending.popleft()
+                yield item, future.result()
+
+
+class ContainerReader(io.RawIOBase):
+    """
+    容器的随机访问读取: seek() 到原始数据的任意位置, read() 时只解压覆盖该位置的块
+    """
+
+    def __init__(self, f, close_file=False):
+        """
+        :param f: 可 seek 的二进制文件对象, 容器从偏移0开始
+        :param close_file: close() 时是否同时关闭 f
+        """
+        super().__init__()
+        self.f = f
+        self.close_file = close_file
+        self.raw_offsets, self.offsets, self.codec_ids, self.size = Container._index(f)
+        self.pos = 0
+        self.block = -1  # 缓存的已解压块的下标
+        self.data = b''
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self.pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError('invalid whence: %r' % whence)
+        if pos < 0:
+            raise ValueError('negative seek position %d' % pos)
+        self.pos = pos
+        return pos
+
+    def _load(self, i):
+        """解压第i块"""
+        if i != self.block:
+            self.f.seek(self.offsets[i])
+            codec_id, raw_len, comp_len = Container.frame.unpack(self.f.read(Container.frame.size))
+            self.data = _expand_block(codec_id, self.f.read(comp_len))
+            self.block = i
+        return self.data
+
+    def readinto(self, b):
+        if self.pos >= self.size or not len(b):
+            return 0
+        i = bisect.bisect_right(self.raw_offsets, self.pos) - 1
+        data = self._load(i)
+        start = self.pos - self.raw_offsets[i]
+        n = min(len(b), len(data) - start)
+        b[:n] = data[start:start + n]
+        self.pos += n
+        return n
+
+    def read(self, size=-1):
+        """读取至多 size 个字节(跨块时依次填入同一个缓冲区), size<0 时读到末尾"""
+        remaining = max(self.size - self.pos, 0)
+        size = remaining if size is None or size < 0 else min(size, remaining)
+        buf = bytearray(size)
+        filled = 0
+        with memoryview(buf) as view:
+            while filled < size:
+                n = self.readinto(view[filled:])
+                if not n:
+                    break
+                filled += n
+        del buf[filled:]
+        return bytes(buf)
+
+    def close(self):
+        if not self.closed and self.close_file:
+            self.f.close()
+        super().close()
+
+
+if __name__ == '__main__':
+    src_fp = 'data/tale.txt'
+    com_fp = 'temp_files/tale.txt.cmpb'
+    exp_fp = 'temp_files/tale.txt'
+    Container.compress(src_fp, com_fp, codec='lzw-variable', block_size=1 << 17)
+    Container.expand(com_fp, exp_fp)
@@ -0,0 +1,188 @@
+"""
+预训练的共享字典: 从样本语料训练LZW的初始符号表(种子)和静态Huffman编码长度, 保存到文件,
+压缩和解压时按ID使用, 省去每条小记录的编码表和符号表预热开销.
+
+    d = Dictionary.train(samples)
+    d.save('dicts')                        # 写入 dicts/<id>.dict
+    LZW.compress_bytes(record, dictionary=d.id)
+    Huffman.compress_bytes(record, mode='static', dictionary=d.id)
+
+字典ID是文件内容的CRC32, 压缩数据中不记录字典ID, 解压时需传入同一个字典(与 mode 一样).
+按ID加载的字典保存在进程内的LRU缓存中.
+
+文件格式:
+    magic(4字节) + 版本(1字节)
+    Huffman编码长度: 256字节, 每个字节值一个, 0表示没有静态Huffman表
+    LZW种子条目数(4字节), 每个条目: 前缀编码(4字节) + 最后一个字节(1字节), 按编码顺序
+"""
+import functools
+import os
+import struct
+import zlib
+from collections import Counter
+
+from Huffman import Huffman
+
+SEARCH_PATH = [os.environ.get('COMPRESS_DICT_DIR', 'dicts')]  # 按ID查找字典文件的目录
+CACHE_SIZE = 32  # LRU缓存的字典个数
+
+
+class Dictionary(object):
+    magic = b'CDIC'
+    version = 1
+    header = struct.Struct('>4sB')
+    count = struct.Struct('>I')
+    entry = struct.Struct('>IB')  # 前缀编码, 最后一个字节
+    char_set_len = 256
+    first_code = 258  # 种子条目的起始编码, 与变长LZW一致(256: EOF, 257: 清空); 定长LZW中257空着不用
+    seed_len = 1024  # 默认的LZW种子条目数上限
+    train_code_len = 1 << 16  # 训练时LZW符号表的最大条目数
+
+    def __init__(self, lengths=None, seed=()):
+        """
+        :param lengths: 静态Huffman编码长度 {字节: 编码长度}, 包含全部256个字节值; None表示没有
+        :param seed: LZW种子条目 [(前缀编码, 字节)], 第i个条目的编码是 first_code + i
+        """
+        self.lengths = lengths
+        self.seed = list(seed)
+        self.id = zlib.crc32(self.to_bytes())
+        self._code_table = self._decode_table = None
+
+    @staticmethod
+    def train(samples, huffman=True, lzw=True, seed_len=seed_len):
+        """
+        从样本语料训练字典
+        :param samples: 样本(bytes)的可迭代对象, 每个样本相当于一条记录
+        :param huffman: 是否训练静态Huffman编码长度(每个字节值的频率加1, 保证任意输入都能编码)
+        :param lzw: 是否训练LZW种子
+        :param seed_len: LZW种子条目数上限
+        :return: Dictionary
+        """
+        samples = list(samples)
+        lengths = None
+        if huffman:
+            freq = Counter(range(Dictionary.char_set_len))
+            for sample in samples:
+                freq.update(sample)
+            lengths = Huffman._code_lengths(freq)
+        seed = Dictionary._train_seed(samples, seed_len) if lzw else ()
+        return Dictionary(lengths, seed)
+
+    @staticmethod
+    def _train_seed(samples, seed_len):
+        """
+        在样本上运行LZW编码(符号表跨样本保留), 按 输出次数*条目长度 选出最有用的条目及其全部前缀,
+        再按原编码顺序(前缀总在前面)重新编号
+        """
+        st = {}
+        parent, size = {}, {}  # 编码 -> 前缀编码, 条目长度
+        uses = Counter()
+        code = Dictionary.first_code
+        for sample in samples:
+            prefix = -1
+            for ch in sample:
+                if prefix < 0:
+                    prefix = ch
+                    continue
+                key = (prefix << 8) | ch
+                nxt = st.get(key)
+                if nxt is not None:
+                    prefix = nxt
+                    continue
+                uses[prefix] += 1
+                if code < Dictionary.first_code + Dictionary.train_code_len:
+                    st[key] = code
+                    parent[code] = (prefix, ch)
+                    size[code] = size.get(prefix, 1) + 1
+                    code += 1
+                prefix = ch
+            if prefix >= 0:
+                uses[prefix] += 1
+        keep = set()
+        for c in sorted((c for c in uses if c >= Dictionary.first_code), key=lambda c: -uses[c] * size[c]):
+            missing = []
+            while c >= Dictionary.first_code and c not in keep:
+                missing.append(c)
+                c = parent[c][0]
+            if len(keep) + len(missing) > seed_len:
+                continue
+            keep.update(missing)
+        codes = sorted(keep)
+        renumber = {c: Dictionary.first_code + i for i, c in enumerate(codes)}
+        return [(renumber.get(parent[c][0], parent[c][0]), parent[c][1]) for c in codes]
+
+    def code_table(self):
+        """静态Huffman编码表 {字节: (编码, 编码长度)}, 只构建一次"""
+        if self.lengths is None:
+            raise ValueError('dictionary %08x has no Huffman table' % self.id)
+        if self._code_table is None:
+            self._code_table = Huffman._canonical_code(self.lengths)
+        return self._code_table
+
+    def decode_table(self):
+        """静态Huffman解码查找表, 只构建一次"""
+        if self._decode_table is None:
+            self._decode_table = Huffman._build_decode_table(self.code_table(), Huffman.table_bit_len)
+        return self._decode_table
+
+    def to_bytes(self):
+        lengths = bytes(256) if self.lengths is None else bytes(self.lengths[ch] for ch in range(256))
+        return b''.join([Dictionary.header.pack(Dictionary.magic, Dictionary.version), lengths,
+                         Dictionary.count.pack(len(self.seed))]
+                        + [Dictionary.entry.pack(p, ch) for p, ch in self.seed])
+
+    @staticmethod
+    def from_bytes(data):
+        magic, version = Dictionary.header.unpack_from(data)
+        if magic != Dictionary.magic:
+            raise ValueError('not a dictionary file: bad magic %r' % magic)
+        if version != Dictionary.version:
+            raise ValueError('unsupported dictionary version: %d' % version)
+        pos = Dictionary.header.size
+        lengths = data[pos:pos + 256]
+        pos += 256
+        n, = Dictionary.count.unpack_from(data, pos)
+        pos += Dictionary.count.size
+        seed = list(Dictionary.entry.iter_unpack(data[pos:pos + n * Dictionary.entry.size]))
+        if len(seed) != n:
+            raise ValueError('truncated dictionary file')
+        return Dictionary(dict(enumerate(lengths)) if any(lengths) else None, seed)
+
+    def save(self, directory=None):
+        """
+        保存到 directory/<id>.dict, 返回文件路径
+        :param directory: 目录, 默认为 SEARCH_PATH[0]
+        """
+        directory = SEARCH_PATH[0] if directory is None else directory
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, '%08x.dict' % self.id)
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+        return path
+
+    @staticmethod
+    def load(path):
+        with open(path, 'rb') as f:
+            return Dictionary.from_bytes(f.read())
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _load_by_id(dict_id):
+    for directory in SEARCH_PATH:
+        path = os.path.join(directory, '%08x.dict' % dict_id)
+        if os.path.exists(path):
+            d = Dictionary.load(path)
+            if d.id != dict_id:
+                raise ValueError('dictionary file %s is corrupt: id %08x' % (path, d.id))
+            return d
+    raise LookupError('dictionary %08x not found in %s' % (dict_id, SEARCH_PATH))
+
+
+def get(dictionary):
+    """
+    :param dictionary: Dictionary 对象, 或字典ID(在 SEARCH_PATH 中查找, 加载后放入LRU缓存)
+    :return: Dictionary
+    """
+    if isinstance(dictionary, Dictionary):
+        return dictionary
+    return _load_by_id(dictionary)
@@ -1,53 +1,53 @@
 """
 检测压缩算法的准确性, 评估压缩率, 效率
 """
+import os
 import time
 
-from bitio import BitReader
+from bitio import BUFFER_SIZE, open_input
 from RunLength import RunLength
 from Huffman import Huffman
 from LZW import LZW
+from LZSS import LZSS
 
 
-class FileBits:
-    def __init__(self, fp):
-        self.f = open(fp, 'rb')
-        self.bit_stream = BitReader(self.f)
-        self.bits = []
-        while True:
-            x = self.bit_stream.read_bit()
-            if not self.bit_stream.read:
-                break
-            self.bits.append(x)
-
-    def __eq__(self, other):
-        if len(self.bits) != len(other.bits):
-            return False
-        return self.bits == other.bits
-
-    def __repr__(self):
-        b = ['1' if x else '0' for x in self.bits]
-        return ''.join(b)
+def file_bits(fp):
+    """文件的比特数"""
+    return os.path.getsize(fp) * 8
 
-    def __len__(self):
-        return len(self.bits)
 
-    def __del__(self):
-        self.f.close()
+def files_equal(fp1, fp2, chunk_size=BUFFER_SIZE):
+    """
+    按段比较两个文件的内容, 内存占用只与 chunk_size 有关
+    :param fp1: 文件1
+    :param fp2: 文件2
+    :param chunk_size: 每次比较的字节数
+    :return: 内容是否完全相同
+    """
+    if os.path.getsize(fp1) != os.path.getsize(fp2):
+        return False
+    with open_input(fp1) as f1, open_input(fp2) as f2:
+        while True:
+            b1, b2 = f1.read(chunk_size), f2.read(chunk_size)
+            if b1 != b2:
+                return False
+            if not b1:
+                return True
 
 
-def evaluate_compress_expand(ori_files, com_files, exp_files, algs):
+def evaluate_compress_expand(ori_files, com_files, exp_files, algs, mode=None):
+    kwargs = {} if mode is None else {'mode': mode}  # None表示算法默认的模式
     for of, cf, ef in zip(ori_files, com_files, exp_files):
-        b_com = time.time()
-        algs.compress(of, cf)  # 压缩, origin -> compress
-        e_com = time.time()
-        algs.expand(cf, ef)  # 解压缩, compress -> origin
-        e_exp = time.time()
-        of_bits, cf_bits, ef_bits = FileBits(of), FileBits(cf), FileBits(ef)
+        b_com = time.perf_counter()
+        algs.compress(of, cf, **kwargs)  # 压缩, origin -> compress
+        e_com = time.perf_counter()
+        algs.expand(cf, ef, **kwargs)  # 解压缩, compress -> origin
+        e_exp = time.perf_counter()
+        of_bits, cf_bits = file_bits(of), file_bits(cf)
         print(of)
-        print('bits', len(of_bits), '->', len(cf_bits), ',rate {:.3f}'.format(len(cf_bits) / len(of_bits)))
+        print('bits', of_bits, '->', cf_bits, ',rate {:.3f}'.format(cf_bits / of_bits))
         print('compress {:.3f}s, expand {:.3f}s'.format(e_com - b_com, e_exp - e_com))
-        assert of_bits == ef_bits  # origin bits == expand bits
+        assert files_equal(of, ef)  # origin bits == expand bits
         print()
 
 
@@ -68,6 +68,28 @@ def evaluate_run_length():
     evaluate_compress_expand(ori_files, com_files, exp_files, RunLength)
 
 
+def make_long_runs(fp, size=8 << 20):
+    """生成由几个数MiB长的0/1游程组成的文件(稀疏位图), 已存在时不重新生成"""
+    if not os.path.exists(fp):
+        with open(fp, 'wb') as f:
+            f.write(bytes(size // 2) + b'\x0f' + b'\xff' * (size // 4) + bytes(size // 4))
+
+
+def evaluate_run_length_varint():
+    print('-' * 30, 'RunLength varint', '-' * 30)
+    make_long_runs('temp_files/longruns.bin')
+    ori_files = ['data/4runs.bin',
+                 'data/q64x96.bin',
+                 'temp_files/longruns.bin']
+    com_files = ['temp_files/4runs.bin.rlv',
+                 'temp_files/q64x96.bin.rlv',
+                 'temp_files/longruns.bin.rlv']
+    exp_files = ['temp_files/4runs.bin',
+                 'temp_files/q64x96.bin',
+                 'temp_files/longruns.bin.out']
+    evaluate_compress_expand(ori_files, com_files, exp_files, RunLength, 'varint')
+
+
 def evaluate_huffman():
     print('-' * 30, 'Huffman', '-' * 30)
     ori_files = ['data/4runs.bin',
@@ -132,7 +154,32 @@ def evaluate_lzw():
     evaluate_compress_expand(ori_files, com_files, exp_files, LZW)
 
 
+def evaluate_lzss():
+    print('-' * 30, 'LZSS', '-' * 30)
+    ori_files = ['data/abra.txt',
+                 'data/q64x96.bin',
+                 'data/tinyTale.txt',
+                 'data/medTale.txt',
+                 'data/tale.txt',
+                 'data/ababLZW.txt']
+    com_files = ['temp_files/abra.txt.lzss',
+                 'temp_files/q64x96.bin.lzss',
+                 'temp_files/tinyTale.txt.lzss',
+                 'temp_files/medTale.txt.lzss',
+                 'temp_files/tale.txt.lzss',
+                 'temp_files/ababLZW.txt.lzss']
+    exp_files = ['temp_files/abra.txt',
+                 'temp_files/q64x96.bin',
+                 'temp_files/tinyTale.txt',
+                 'temp_files/medTale.txt',
+                 'temp_files/tale.txt',
+                 'temp_files/ababLZW.txt']
+    evaluate_compress_expand(ori_files, com_files, exp_files, LZSS)
+
+
 if __name__ == '__main__':
     evaluate_run_length()
+    evaluate_run_length_varint()
     evaluate_huffman()
     evaluate_lzw()
+    evaluate_lzss()
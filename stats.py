@@ -0,0 +1,134 @@
+"""
+压缩/解压过程的统计: 各阶段耗时, 输入/输出字节数, 符号数, LZW符号表填满/清空次数, 比特读写调用次数
+
+    stats = Stats()
+    Huffman.compress('data/tale.txt', 'temp_files/tale.txt.huffman', stats=stats)
+    print(stats)
+
+不传 stats 时各算法使用 NULL_STATS, 它的方法什么都不做; 计数只在每段输入或罕见的分支上进行,
+读写组件和文件对象只在启用统计时才被包装, 所以关闭统计时几乎没有额外开销.
+"""
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+
+class Stats(object):
+    enabled = True
+
+    def __init__(self):
+        self.stages = {}  # 阶段名 -> 累计秒数(不含嵌套在其中的阶段)
+        self.counters = Counter()  # 计数器名 -> 次数
+        self._active = []  # 正在计时的阶段, 最后一个是当前计时的阶段
+        self._mark = 0.0  # 当前阶段上次开始计时的时刻
+
+    @contextmanager
+    def stage(self, name):
+        """
+        计时一个阶段, 同名阶段的耗时累加.
+        阶段可以嵌套: 内层阶段运行期间外层阶段暂停计时, 各阶段的耗时互不重叠, 总和不超过实际耗时
+        """
+        self._switch()
+        self._active.append(name)
+        try:
+            yield
+        finally:
+            self._switch()
+            # 生成器中的阶段可能交错结束, 移除最后一个同名阶段而不是栈顶
+            active = self._active
+            del active[len(active) - 1 - active[::-1].index(name)]
+
+    def _switch(self):
+        """把上次切换以来的耗时记到当前阶段"""
+        now = time.perf_counter()
+        if self._active:
+            name = self._active[-1]
+            self.stages[name] = self.stages.get(name, 0.0) + now - self._mark
+        self._mark = now
+
+    def add(self, name, n=1):
+        self.counters[name] += n
+
+    def reader(self, f):
+        """包装输入文件对象, 统计读入的字节数和读取耗时"""
+        return _CountingFile(f, self, 'bytes_in', 'io_read')
+
+    def writer(self, f):
+        """包装输出文件对象, 统计写出的字节数和写入耗时"""
+        return _CountingFile(f, self, 'bytes_out', 'io_write')
+
+    def bit_writer(self, writer):
+        """统计 BitWriter 各方法的调用次数"""
+        self._count_calls(writer, ('write_bit', 'write_bits', 'write_gamma', 'write_bytes'))
+        return writer
+
+    def bit_reader(self, reader):
+        """统计 BitReader 各方法的调用次数"""
+        self._count_calls(reader, ('read_bit', 'read_bits', 'read_gamma', 'read_bytes'))
+        return reader
+
+    def _count_calls(self, obj, names):
+        counters = self.counters
+        for name in names:
+            def counted(*args, _method=getattr(obj, name), _name=name):
+                counters[_name] += 1
+                return _method(*args)
+            setattr(obj, name, counted)
+
+    def as_dict(self):
+        return {'stages': dict(self.stages), 'counters': dict(self.counters)}
+
+    def __str__(self):
+        lines = ['%-14s %10.4fs' % (name, t) for name, t in self.stages.items()]
+        lines += ['%-14s %10d' % (name, n) for name, n in sorted(self.counters.items())]
+        return '\n'.join(lines)
+
+
+class _NullStats(object):
+    """关闭统计时使用, 所有方法都不做任何事"""
+    enabled = False
+
+    def stage(self, name):
+        return nullcontext()
+
+    def add(self, name, n=1):
+        pass
+
+    def reader(self, f):
+        return f
+
+    def writer(self, f):
+        return f
+
+    def bit_writer(self, writer):
+        return writer
+
+    def bit_reader(self, reader):
+        return reader
+
+
+NULL_STATS = _NullStats()
+
+
+class _CountingFile(object):
+    """包装二进制文件对象, read/write 时累计字节数和耗时, 其余属性转给原对象"""
+    def __init__(self, f, stats, counter, stage):
+        self.f = f
+        self.stats = stats
+        self.counter = counter
+        self.stage = stage
+
+    def read(self, size=-1):
+        with self.stats.stage(self.stage):
+            data = self.f.read(size)
+        self.stats.add(self.counter, len(data))
+        return data
+
+    def write(self, data):
+        with self.stats.stage(self.stage):
+            n = self.f.write(data)
+        self.stats.add(self.counter, len(data))
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self.f, name)